@@ -29,6 +29,10 @@ operation = data.get('operation', 'cool')
 setpoint = data.get('setpoint', 73)
 window = data.get('window', 'binary_sensor.bedroom_window')
 from_timer = data.get('from_timer', False)
+# Optional input_text holding the last target set by this script. With it,
+# timer runs only act when the target changes (edge-triggered) instead of
+# only within interval minutes of time_on.
+state_entity = data.get('state_entity')
 time_on = datetime.datetime.strptime(data.get('time_on', '20:00'), '%H:%M').time()
 time_off = datetime.datetime.strptime(data.get('time_off', '09:00'), '%H:%M').time()
 
@@ -36,7 +40,7 @@ first_interval_start = time_offset(time_on, -interval)
 first_interval_end = time_offset(time_on, interval)
 
 current_mode = hass.states.get('input_select.climate_mode').state
-current_operation = hass.states.get(climate_unit).state
+climate_state = hass.states.get(climate_unit)
 now = datetime.datetime.now().time()
 
 in_interval = is_time_between(time_on, time_off, now)
@@ -44,7 +48,7 @@ in_first_interval = is_time_between(first_interval_start, first_interval_end, no
 
 window_open = False
 if window:
-    window_open = hass.states.get(window).state is 'on'
+    window_open = hass.states.get(window).state == 'on'
 else:
     window_open = False
 
@@ -60,9 +64,10 @@ if (not in_target_mode) or window_open or (not in_interval):
     turn_off = True
     decided = True
 
-# If we're called from timer, turn on if we're in the first interval
+# If we're called from timer, turn on if we're in the first interval, or
+# on the transition into the interval when edge-triggered
 if not decided:
-    if from_timer and in_first_interval:
+    if from_timer and (in_first_interval or state_entity):
         turn_on = True
         decided = True
 
@@ -78,15 +83,44 @@ if decided and turn_off:
 elif decided and turn_on:
     target_operation = operation
 
+target_state = "{}-{}".format(target_operation, setpoint)
+if target_operation == 'off':
+    target_state = 'off'
+
+saved_state = None
+if state_entity:
+    saved = hass.states.get(state_entity)
+    if saved:
+        saved_state = saved.state
+    # Timer runs leave the unit alone (and any manual change to it) until
+    # the target itself changes
+    if decided and from_timer and target_state == saved_state:
+        decided = False
+
 if decided:
-    logger.info("Setting {} to mode {} target {}".format(climate_unit, target_operation, setpoint))
-    service_data = {
-        "entity_id": climate_unit,
-        "temperature": setpoint,
-        "operation_mode": target_operation}
-    hass.services.call('climate', 'set_temperature', service_data, False)
-    service_data = {
-        "entity_id": climate_unit,
-        "operation_mode": target_operation}
-    hass.services.call('climate', 'set_operation_mode', service_data, False)
+    # Only send what the unit isn't already at
+    mode_differs = True
+    temperature_differs = target_operation != 'off'
+    if climate_state:
+        mode_differs = climate_state.state != target_operation
+        current = climate_state.attributes.get('temperature')
+        temperature_differs = (target_operation != 'off' and
+                               (current is None or
+                                float(current) != float(setpoint)))
+    if mode_differs or temperature_differs:
+        logger.info("Setting {} to mode {} target {}".format(climate_unit, target_operation, setpoint))
+    if temperature_differs:
+        service_data = {
+            "entity_id": climate_unit,
+            "temperature": setpoint}
+        if mode_differs:
+            service_data["hvac_mode"] = target_operation
+        hass.services.call('climate', 'set_temperature', service_data, False)
+    elif mode_differs:
+        service_data = {
+            "entity_id": climate_unit,
+            "hvac_mode": target_operation}
+        hass.services.call('climate', 'set_hvac_mode', service_data, False)
+    if state_entity and target_state != saved_state:
+        hass.states.set(state_entity, target_state)
         
@@ -0,0 +1,324 @@
+"""Seasons as a resident Home Assistant integration.
+
+Runs the schedules of seasons.py without automations or polling: the
+component carries its own copy of the script, whose schedule logic is
+loaded once, and the compiled schedules stay in memory. The units reading
+an entity are re-evaluated when it changes, and all units at the exact
+minute of the next schedule boundary. Service calls are issued
+asynchronously::
+
+    seasons:
+      global_mode: input_select.climate_mode
+      at_home_sensor: binary_sensor.anyone_home
+      state_entity: input_text.seasons_{}
+      seasons: !include seasons.yaml
+
+climate_units, debounce, throttle and overrides work as the python_script
+inputs of the same name; see the comments at the top of seasons.py.
+"""
+import asyncio
+import contextlib
+import datetime
+import logging
+
+import voluptuous as vol
+
+from homeassistant.core import callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import (
+    async_track_point_in_time, async_track_state_change_event)
+from homeassistant.helpers.start import async_at_started
+from homeassistant.util import dt as dt_util
+
+from .engine import Engine
+
+DOMAIN = 'seasons'
+
+CONF_AT_HOME_SENSOR = 'at_home_sensor'
+CONF_CLIMATE_UNITS = 'climate_units'
+CONF_DEBOUNCE = 'debounce'
+CONF_GLOBAL_MODE = 'global_mode'
+CONF_OVERRIDES = 'overrides'
+CONF_SEASONS = 'seasons'
+CONF_STATE_ENTITY = 'state_entity'
+CONF_THROTTLE = 'throttle'
+
+_LOGGER = logging.getLogger(__name__)
+
+THROTTLE_SCHEMA = vol.Schema({
+    vol.Optional('max_in_flight', default=1): cv.positive_int,
+    vol.Optional('stagger', default=0): vol.Coerce(float),
+})
+
+CONFIG_SCHEMA = vol.Schema({
+    DOMAIN: vol.Schema({
+        vol.Required(CONF_GLOBAL_MODE): cv.entity_id,
+        vol.Required(CONF_STATE_ENTITY): cv.string,
+        vol.Required(CONF_SEASONS): dict,
+        vol.Optional(CONF_AT_HOME_SENSOR): cv.entity_id,
+        vol.Optional(CONF_CLIMATE_UNITS, default='all'):
+            vol.Any('all', cv.entity_ids),
+        vol.Optional(CONF_DEBOUNCE, default=0): vol.Coerce(float),
+        vol.Optional(CONF_THROTTLE, default={}): {cv.string: THROTTLE_SCHEMA},
+        vol.Optional(CONF_OVERRIDES, default=[]): [dict],
+    })
+}, extra=vol.ALLOW_EXTRA)
+
+
+async def async_setup(hass, config):
+    conf = config[DOMAIN]
+    engine = await hass.async_add_executor_job(
+        Engine, hass, {'global_mode': conf[CONF_GLOBAL_MODE]}, _LOGGER)
+    await hass.async_add_executor_job(engine.use_schedules,
+                                      conf[CONF_SEASONS])
+    await hass.async_add_executor_job(engine.load_overrides,
+                                      conf[CONF_OVERRIDES],
+                                      dt_util.now().tzinfo)
+    controller = SeasonsController(hass, engine, conf)
+    if len(controller.units) > 1 and '{}' not in conf[CONF_STATE_ENTITY]:
+        # Each unit's state would overwrite the others'
+        _LOGGER.error("state_entity %s needs '{}' to tell the climate units "
+                      "apart", conf[CONF_STATE_ENTITY])
+        return False
+    hass.data[DOMAIN] = controller
+    async_at_started(hass, controller.async_start)
+    return True
+
+
+class SeasonsController:
+    """Evaluates the climate units on input changes and at boundaries."""
+
+    def __init__(self, hass, engine, conf):
+        self.hass = hass
+        self.engine = engine
+        self.conf = conf
+        self.units = conf[CONF_CLIMATE_UNITS]
+        if self.units == 'all':
+            self.units = engine.all_units()
+        self.pending = set()
+        self.transitions = {}
+        self.generations = {unit: 0 for unit in self.units}
+        self.locks = {unit: asyncio.Lock() for unit in self.units}
+        self.semaphores = {prefix: asyncio.Semaphore(limits['max_in_flight'])
+                           for prefix, limits in conf[CONF_THROTTLE].items()}
+        self.next_start = {}
+        self.debouncer = Debouncer(
+            hass, _LOGGER, cooldown=conf[CONF_DEBOUNCE], immediate=True,
+            function=self._async_evaluate_pending)
+        self.table = {}
+        self.dependencies = {}
+        self._unsub_timer = None
+        self._unsub_refresh = None
+
+    async def async_start(self, hass):
+        at_home_sensor = self.conf.get(CONF_AT_HOME_SENSOR)
+        # Built once: the schedules and overrides are fixed until a restart
+        self.dependencies = self.engine.dependency_index(at_home_sensor)
+        entities = set(self.dependencies)
+        entities.add(self.conf[CONF_GLOBAL_MODE])
+        if at_home_sensor:
+            entities.add(at_home_sensor)
+        async_track_state_change_event(hass, sorted(entities),
+                                       self._async_input_changed)
+        # Like a timer run: pick up schedule changes missed while stopped,
+        # but leave manual changes alone
+        await self.async_evaluate(self.units, from_timer=True)
+
+    @callback
+    def _async_input_changed(self, event):
+        entity_id = event.data['entity_id']
+        mode = self.hass.states.get(self.conf[CONF_GLOBAL_MODE])
+        if mode is None:
+            return
+        affected = self.engine.dependent_units(self.dependencies, entity_id,
+                                               mode.state)
+        self.pending.update(unit for unit in affected if unit in self.locks)
+        if self.pending:
+            self.hass.async_create_task(self.debouncer.async_call())
+
+    async def _async_evaluate_pending(self):
+        units = sorted(self.pending)
+        self.pending.clear()
+        await self.async_evaluate(units, from_timer=False)
+
+    async def _async_boundary(self, now):
+        self._unsub_timer = None
+        await self.async_evaluate(self.units, from_timer=True)
+
+    def _read_inputs(self, snapshot):
+        # (global mode, is_home), or None before the mode entity exists
+        mode = self.engine.snapshot_state(snapshot,
+                                          self.conf[CONF_GLOBAL_MODE])
+        if mode is None:
+            return None
+        at_home_sensor = self.conf.get(CONF_AT_HOME_SENSOR)
+        is_home = False
+        if at_home_sensor:
+            home = self.engine.snapshot_state(snapshot, at_home_sensor)
+            is_home = bool(home) and home.state == 'on'
+        return (mode.state, is_home)
+
+    def _clock(self):
+        now = dt_util.now().replace(second=0, microsecond=0)
+        # Calendars are built per local day; earlier days are done with
+        self.engine.forget_calendars_before(now.date())
+        return (now, int(now.timestamp()) // 60)
+
+    async def async_evaluate(self, units, from_timer):
+        """Decide for ``units`` and send the resulting service calls."""
+        engine = self.engine
+        snapshot = engine.new_snapshot(self.hass.states)
+        inputs = self._read_inputs(snapshot)
+        if inputs is None:
+            return
+        current_mode, is_home = inputs
+        now, now_epoch_minute = self._clock()
+
+        commands = {}
+        saves = []
+        for unit in units:
+            try:
+                self._decide(unit, current_mode, is_home, from_timer, now,
+                             now_epoch_minute, snapshot, commands, saves)
+            except Exception:  # pylint: disable=broad-except
+                # One unit's unreadable input leaves that unit alone
+                _LOGGER.exception("Leaving %s alone", unit)
+            # Any call still waiting for this unit is now out of date
+            self.generations[unit] = self.generations[unit] + 1
+        # Units needing no call are written now, the others once their
+        # call has gone out
+        for save in saves:
+            engine.save_decision(save)
+
+        self._schedule_next_boundary()
+        # Window-open 'off' commands take the first places in their groups
+        ordered = [command for command in commands.values()
+                   if command['urgent']]
+        ordered.extend(command for command in commands.values()
+                       if not command['urgent'])
+        calls = engine.group_commands(ordered, self.conf[CONF_THROTTLE])
+        sending = asyncio.gather(*(self._async_send(call) for call in calls))
+        # Refresh the table once the calls have started, not before
+        self.hass.loop.call_soon(self._refresh_table, is_home, now,
+                                 now_epoch_minute, snapshot)
+        await sending
+
+    def _decide(self, unit, current_mode, is_home, from_timer, now,
+                now_epoch_minute, snapshot, commands, saves):
+        engine = self.engine
+        state_entity = engine.unit_state_entity(
+            self.conf[CONF_STATE_ENTITY], unit)
+        state = engine.snapshot_state(snapshot, state_entity)
+        saved_state = state.state if state else None
+        humid_latch = None
+        if state:
+            humid_latch = state.attributes.get('humid_latch')
+        if humid_latch and humid_latch[0] == current_mode:
+            humid_latch = humid_latch[1]
+        else:
+            humid_latch = None
+        decision = None
+        if not from_timer and humid_latch is None:
+            # Event runs, a global_mode change above all, usually find the
+            # decision ready in the mode table
+            decision = engine.table_decision(
+                self.table, current_mode, unit, is_home, now_epoch_minute,
+                snapshot)
+        if decision is None:
+            decision = engine.evaluate_unit(
+                unit, current_mode, is_home, saved_state, from_timer, now,
+                snapshot, humid_latch)
+        key = (current_mode, unit)
+        next_transition = None
+        if decision['next_boundary'] is not None:
+            next_transition = datetime.datetime.fromtimestamp(
+                (now_epoch_minute + decision['next_boundary']) * 60,
+                now.tzinfo)
+        self.transitions[unit] = next_transition
+        changes = {
+            'next_transition': None,
+            'fingerprint': engine.fingerprint(
+                decision, key, is_home, now_epoch_minute, snapshot),
+            'humid_latch': None
+        }
+        if decision['humid_latch'] is not None:
+            changes['humid_latch'] = [current_mode, decision['humid_latch']]
+        if next_transition:
+            changes['next_transition'] = next_transition.isoformat()
+        engine.apply_decision(decision, state_entity, state, snapshot,
+                              changes, commands, saves)
+
+    def _refresh_table(self, is_home, now, now_epoch_minute, snapshot):
+        # Bring every mode's decisions up to date, and come back when the
+        # first of them expires
+        self.table = self.engine.mode_table(
+            self.units, is_home, now, now_epoch_minute, snapshot,
+            self.table)
+        if self._unsub_refresh:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+        expiries = [entry['fingerprint']['until']
+                    for entries in self.table.values()
+                    for entry in entries.values()
+                    if entry['fingerprint']['until'] is not None]
+        if expiries:
+            self._unsub_refresh = async_track_point_in_time(
+                self.hass, self._async_refresh,
+                dt_util.utc_from_timestamp(min(expiries) * 60))
+
+    @callback
+    def _async_refresh(self, now):
+        self._unsub_refresh = None
+        snapshot = self.engine.new_snapshot(self.hass.states)
+        inputs = self._read_inputs(snapshot)
+        if inputs is None:
+            return
+        now, now_epoch_minute = self._clock()
+        self._refresh_table(inputs[1], now, now_epoch_minute, snapshot)
+
+    def _schedule_next_boundary(self):
+        if self._unsub_timer:
+            self._unsub_timer()
+            self._unsub_timer = None
+        upcoming = [when for when in self.transitions.values() if when]
+        if upcoming:
+            self._unsub_timer = async_track_point_in_time(
+                self.hass, self._async_boundary, min(upcoming))
+
+    async def _async_send(self, call):
+        generations = {unit: self.generations[unit] for unit in call['units']}
+        group = self.engine.throttle_group(call['units'][0],
+                                           self.conf[CONF_THROTTLE])
+        if group is not None:
+            # Stagger starts within the group, in the order queued
+            loop_now = self.hass.loop.time()
+            start = max(loop_now, self.next_start.get(group, loop_now))
+            self.next_start[group] = (
+                start + self.conf[CONF_THROTTLE][group]['stagger'])
+            await asyncio.sleep(start - loop_now)
+            async with self.semaphores[group]:
+                await self._async_call(generations, call)
+        else:
+            await self._async_call(generations, call)
+
+    async def _async_call(self, generations, call):
+        # One call in flight per unit, and none for a superseded decision.
+        # Locks are taken in a fixed order so two calls sharing units
+        # cannot wait on each other.
+        async with contextlib.AsyncExitStack() as stack:
+            for unit in sorted(generations):
+                await stack.enter_async_context(self.locks[unit])
+            units = [unit for unit in call['units']
+                     if self.generations[unit] == generations[unit]]
+            if not units:
+                return
+            await self.hass.services.async_call(
+                'climate', call['service'],
+                self.engine.call_data(call, units), blocking=True)
+            # Unless a newer decision for the unit came in meanwhile
+            for command in call['commands']:
+                unit = command['service_data']['entity_id']
+                if (unit in units and
+                        self.generations[unit] == generations[unit]):
+                    self.engine.save_decision(command['save'])
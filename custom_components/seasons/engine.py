@@ -0,0 +1,45 @@
+"""The schedule logic of seasons.py, run inside the integration.
+
+The component ships its own copy of the script, seasons.py next to this
+module, and loads it with the same loader as tools/engine.py. The script's
+``hass`` global is replaced by a stand-in that is safe to use from the
+event loop.
+"""
+from .loader import SCRIPT, ScriptEngine
+
+
+class _LoopStates:
+    """hass.states for engine code called from the event loop."""
+
+    def __init__(self, hass):
+        self._hass = hass
+
+    def get(self, entity_id):
+        return self._hass.states.get(entity_id)
+
+    def set(self, entity_id, state, attributes=None, force_update=False):
+        self._hass.states.async_set(entity_id, state, attributes,
+                                    force_update)
+
+
+class _LoopHass:
+    def __init__(self, hass):
+        self.states = _LoopStates(hass)
+
+
+class Engine(ScriptEngine):
+    """seasons.py's functions, reading and setting states through ``hass``."""
+
+    def __init__(self, hass, data, logger):
+        super().__init__(SCRIPT, {
+            'hass': _LoopHass(hass),
+            'logger': logger,
+            'data': data,
+        })
+
+    def use_schedules(self, seasons):
+        """Compile every key of ``seasons`` ({mode: {unit: [...]}}) now, so
+        evaluations only look them up."""
+        self.namespace['SEASONS'] = self.load_seasons(seasons)
+        self.forget_compiled()
+        self.compiled_form()
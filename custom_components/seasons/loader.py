@@ -0,0 +1,49 @@
+"""Load the schedule logic of seasons.py, with or without Home Assistant.
+
+seasons.py is a python_script: Home Assistant execs it with ``hass``,
+``data`` and ``logger`` injected, and the run itself is top-level code. The
+loader keeps only the function definitions and the upper-case module
+constants, so the integration and the offline tools in tools/ run the very
+same compile/index/match code as the script.
+
+This module imports nothing from Home Assistant; tools/engine.py loads it by
+path.
+"""
+import ast
+import datetime
+import os
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'seasons.py')
+
+
+def _engine_nodes(tree):
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            yield node
+        elif (isinstance(node, ast.Assign) and
+              all(isinstance(target, ast.Name) and target.id.isupper()
+                  for target in node.targets)):
+            yield node
+
+
+class ScriptEngine:
+    """The functions and constants of seasons.py in their own namespace.
+
+    ``namespace`` supplies the globals the script expects from the
+    python_script sandbox besides ``datetime``: ``hass``, ``data`` and
+    ``logger``.
+    """
+
+    def __init__(self, path, namespace):
+        with open(path) as source:
+            tree = ast.parse(source.read(), filename=path)
+        tree.body = list(_engine_nodes(tree))
+        self.namespace = dict(namespace, datetime=datetime)
+        exec(compile(tree, path, 'exec'), self.namespace)
+
+    def __getattr__(self, name):
+        try:
+            return self.namespace[name]
+        except KeyError:
+            raise AttributeError(name) from None
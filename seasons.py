@@ -3,22 +3,118 @@
 # schedule.
 #
 # INPUTS:
-# * climate_unit (required): The Climate entity to be controlled
+# * climate_unit (required unless climate_units is given): The Climate entity to
+#   be controlled
+# * climate_units (optional): A list of Climate entities to evaluate in a single
+#   run, or 'all' for every climate unit appearing anywhere in SEASONS. Shared
+#   inputs are read once and every unit is evaluated in the same pass.
 # * global_mode (required): an entity whose state is the desired global climate
 #   mode (usually an input_select)
 # * state_entity (required): an input_text entity, unique to this climate_unit,
-#   where the script can store some information between runs.
+#   where the script can store some information between runs. With
+#   climate_units, include '{}' in the name; it is replaced by each unit's
+#   object id (e.g. input_text.seasons_{} -> input_text.seasons_master_br).
+#   Without it, a run for more than one unit logs an error and leaves them
+#   all alone, rather than have them overwrite each other's state.
+#   Its next_transition attribute holds the next time any of the unit's
+#   schedules starts or ends in the current global mode, and its fingerprint
+#   attribute lets timer runs stop early when neither that time has come nor
+#   any input the last decision depended on has changed.
+# * next_transition_entity (optional): an input_datetime (with date and time)
+#   set to the next schedule transition, for use as a time trigger. With
+#   climate_units it holds the earliest transition of all units, unless it
+#   contains '{}' as described for state_entity. A run covering only some
+#   units (changed_entity, or one climate_unit) also counts the others'
+#   saved next_transition; without '{}' in state_entity, it only moves the
+#   entity later once the time it holds has passed.
+# * changed_entity (optional): the entity whose change triggered this run,
+#   usually '{{ trigger.entity_id }}'. Only the climate units whose schedules
+#   in the current global mode read that entity (as window, humidity_sensor,
+#   or at_home_sensor for if_home/if_away schedules) are evaluated; a change
+#   of global_mode re-evaluates all units. Without climate_unit or
+#   climate_units the candidates are all units; state_entity then needs '{}'.
+# * metrics_entity (optional): an entity (e.g. sensor.seasons_metrics) set to
+#   the wall time of each run in ms, with counters of units evaluated,
+#   short-circuited or deferred (see debounce), schedules scanned, entity
+#   reads, service calls issued, skipped, superseded (see throttle) or merged
+#   into another unit's identical call, time spent waiting between calls,
+#   and the title of the schedule each unit followed as attributes. Calls
+#   issued, superseded and merged and the wait are counted as the run sends
+#   its calls, after every unit is decided, so they are run-level only: with
+#   '{}' in the name (see state_entity) there is one such entity per climate
+#   unit, and on those the four read 0.
 # * at_home_sensor (optional): an entity that represents whether anyone is home
 #   (usually a binary_sensor)
 # * from_timer (optional): whether the script was triggered by timer. If true,
 #   only changes that modify the last-set operation mode or setpoint take
 #   effect. This is done so that manual changes are left alone until the next
 #   schedule switch.
+# * debounce (optional): a quiet window in seconds. Once an event (non-timer)
+#   run has evaluated a unit, further event runs for it within the window only
+#   mark it pending; the unit is evaluated once, with the inputs current at
+#   that time, by the first run after the window closes. next_transition_entity
+#   is set to the end of the window, so a time trigger on it picks pending
+#   units up on time; without it they wait for the next interval run. Timer
+#   runs are not debounced, but do not evaluate a pending unit before its
+#   window closes, and treat it as an event run after.
+#   Give the automations calling the script 'mode: queued' so that at most one
+#   run, and so one evaluation per unit, is in flight at a time.
+# * throttle (optional): limits on the climate service calls of a run, keyed
+#   by entity id prefix, e.g. {'climate.ecobee_': {'max_in_flight': 2,
+#   'stagger': 1.5}}. Calls for units matching a prefix (the longest one, if
+#   several match) are sent in waves of at most max_in_flight, stagger
+#   seconds apart. Units matching no prefix are not throttled. Turning a unit
+#   off because a window opened always goes first. The run sleeps between
+#   waves (time.sleep), so it holds its python_script thread for the sum of
+#   the staggers, and under 'mode: queued' the next run waits that long too.
+#   A call still waiting is dropped if another run has decided for the same
+#   unit meanwhile. That needs overlapping runs ('mode: parallel'); under
+#   'mode: queued', as recommended for debounce, no call is ever dropped.
 #
-# The last input is the 'seasons' dictionary as defined below, which defines the
-# scheduled behavior for each global mode / climate unit combination. It's a
-# dictionary keyed by a tuple of global mode and climate unit. Each entry is a
-# list of schedules, where each schedule has the following fields:
+# Whatever triggered the run, the climate entity's current hvac mode and target
+# temperature are compared against the decision and only the service calls
+# for values that differ are issued. Units needing the very same call share
+# one call with a list of entity ids.
+#
+# * seasons (optional): the schedules, usually kept in their own file and
+#   passed as 'seasons: !include seasons.yaml' (see seasons.yaml for an
+#   example). Without it, the SEASONS dictionary below is used; if that is
+#   empty too, the run leaves every unit alone and logs a warning. Its
+#   'templates' entry is not a global mode but names lists of schedules to
+#   be reused: a schedule {'use': name, ...}, or just the name, stands for
+#   the template's schedules, with any other fields it gives replacing
+#   theirs, and a unit given a template's name in place of its list gets
+#   the template's schedules.
+# * overrides (optional): dated exceptions, checked before the schedules of
+#   the current global mode, usually kept in their own file as well, e.g.
+#     - title: 'Vacation'
+#       start: '2026-12-20'
+#       end: '2026-12-31'
+#       units: [climate.master_br, climate.loft]
+#       operation: 'heat'
+#       setpoint: 58
+#   start and end are dates (end included) or 'YYYY-MM-DD HH:MM' local
+#   times (end excluded). units is a list, a single unit or 'all' (the
+#   default), and modes optionally limits the override to those global
+#   modes. The first override in the list that is in effect wins. The other
+#   fields are those of a schedule, except time_on, time_off and days. The
+#   start and end of an override are schedule transitions like any other.
+# * cache_entity (optional): an entity (e.g. sensor.seasons_cache) where the
+#   compiled schedules are kept between runs, each distinct schedule once
+#   however many units use it, along with the seasons input they came from.
+#   While that input is unchanged, runs use them as saved, without
+#   expanding templates or compiling anything. The day's transition
+#   calendars, the schedule boundaries as actual instants in the local
+#   timezone, are kept there too and built once a day for each distinct list
+#   of schedules. Exclude it from the recorder, its attributes are large.
+#   Without it, a run compiles only the schedules it looks up and checks
+#   their times straight, building neither index nor calendar, which is
+#   quickest for a run evaluating a unit or two.
+#
+# The schedules define the scheduled behavior for each global mode / climate
+# unit combination. The seasons input is keyed by global mode and then by
+# climate unit; SEASONS is keyed by a tuple of both. Each entry is a list of
+# schedules, where each schedule has the following fields:
 # * title: Used only for logging and to help you find the right entry for edits
 # * time_on / time_off (optional): Start and stop of this schedule, 24-hour
 #   hours:minutes. If not given, this schedule is always active (though see
@@ -43,655 +139,1388 @@
 # * if_humid (optional): Percentage. If present, this schedule will only apply
 #   if the humidity reported by the humidity_sensor is above this value at the
 #   beginning of the period.
+# * if_humid_release (optional): Percentage, below if_humid. Once the schedule
+#   applies, it keeps applying until the humidity drops below this value
+#   instead of if_humid, so a reading hovering around if_humid doesn't flip the
+#   unit back and forth. The latch is kept in the state_entity's humid_latch
+#   attribute.
 #
 # Put this script in <config>/python_scripts (create the directory if needed)
 # and activate it as described at
 # https://www.home-assistant.io/components/python_script/ .
 # You should set up automations to call service python_script.seasons for each
-# relevant climate unit for the each of the following events:
+# relevant climate unit (or once with climate_units: all) for the each of the
+# following events:
 # * your global_mode entity changes (all climate units)
 # * your at_home_sensor changes (all climate units)
 # * your window sensor(s) change(s) (relevant climate units)
+# A single automation triggered by all of these entities can instead pass
+# changed_entity, and the script works out the relevant units itself.
 # * on a time_interval, suggested every 15 minutes. (all climate units). This
 #   interval is the resolution of your scheduled changes, so make it more or
 #   less frequent as required.
+#   Alternatively, give next_transition_entity and use a time trigger on it
+#   ('at: input_datetime.seasons_next'); schedule changes then happen on the
+#   exact minute, and the interval trigger is only a safety net.
 
-SEASONS = {
-    ('Cold Winter', 'climate.first_floor_heat'): [
-        {
-            'title': 'Ecobee schedule',
-            'operation': 'heat'
-        }
-    ],
-    ('Cold Winter', 'climate.second_floor'): [
-        {
-            'title': 'Ecobee schedule',
-            'operation': 'heat'
-        }
-    ],
-    ('Cold Winter', 'climate.loft_heat'): [
-        {
-            'title': 'Ecobee schedule',
-            'operation': 'heat'
-        }
-    ],
-    ('Winter', 'climate.first_floor_heat'): [
-        {
-            'title': 'Ecobee schedule',
-            'operation': 'heat'
-        }
-    ],
-    ('Winter', 'climate.second_floor'): [
-        {
-            'title': 'Ecobee schedule',
-            'operation': 'heat'
-        }
-    ],
-    ('Winter', 'climate.master_br'): [
-        {
-            'title': 'Winter Sleeping',
-            'time_on': '21:29',
-            'time_off': '07:59',
-            'operation': 'heat',
-            'setpoint': 64
-        }
-    ],
-    ('Winter', 'climate.loft_heat'): [
-        {
-            'title': 'Ecobee schedule',
-            'operation': 'heat'
-        }
-    ],
-    ('Cold Shoulder', 'climate.first_floor_heat'): [
-        {
-            'title': 'Ecobee schedule',
-            'operation': 'heat'
-        }
-    ],
-    ('Cold Shoulder', 'climate.master_br'): [
-        {
-            'title': 'Morning (weekday)',
-            'days': 'MTWTF..',
-            'time_on': '05:44',
-            'time_off': '07:59',
-            'operation': 'heat',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 67
-        },
-        {
-            'title': 'Morning (weekend)',
-            'days': '.....SS',
-            'time_on': '07:29',
-            'time_off': '08:59',
-            'operation': 'heat',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 68
-        },
-        {
-            'title': 'Sleeping',
-            'time_on': '21:59',
-            'time_off': '08:59',
-            'operation': 'heat',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 64
-        },
-        {
-            'title': 'Day (Away)',
-            'time_on': '07:59',
-            'time_off': '16:29',
-            'if_away': True,
-            'operation': 'heat',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 62
-        },
-        {
-            'title': 'Day (Home)',
-            'time_on': '07:59',
-            'time_off': '17:59',
-            'operation': 'heat',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 68
-        },
-        {
-            'title': 'Evening (Away)',
-            'time_on': '17:59',
-            'time_off': '21:44',
-            'operation': 'heat',
-            'window': 'binary_sensor.bedroom_window',
-            'if_away': True,
-            'setpoint': 62
-        },
-        {
-            'title': 'Evening (Home)',
-            'time_on': '15:59',
-            'time_off': '21:44',
-            'operation': 'heat',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 68
-        }
-    ],
-    ('Cold Shoulder', 'climate.loft_heat'): [
-        {
-            'title': 'Morning Boost',
-            'operation': 'heat',
-            'time_on': '06:59',
-            'time_off': '07:44',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 68
-        }
-    ],
-    ('Cold Shoulder', 'climate.loft'): [
-        {
-            'title': 'Night',
-            'operation': 'heat',
-            'time_on': '00:04',
-            'time_off': '07:14',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 61
-        },
-        {
-            'title': 'Day (Weekday)',
-            'days': 'MTWTF..',
-            'operation': 'heat',
-            'time_on': '07:14',
-            'time_off': '16:59',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 68
-        },
-        {
-            'title': 'Day (Weekend)',
-            'days': '.....SS',
-            'operation': 'heat',
-            'time_on': '08:59',
-            'time_off': '16:59',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 62
-        },
-        {
-            'title': 'Evening',
-            'operation': 'heat',
-            'time_on': '16:59',
-            'time_off': '00:04',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 63
-        }
-    ],
-    ('Warm Shoulder', 'climate.first_floor'): [
-        {
-            'title': 'Morning (weekday)',
-            'days': 'MTWTF..',
-            'time_on': '05:44',
-            'time_off': '07:59',
-            'operation': 'heat',
-            'setpoint': 68
-        },
-        {
-            'title': 'Morning (weekend)',
-            'days': '.....SS',
-            'time_on': '07:29',
-            'time_off': '08:59',
-            'operation': 'heat',
-            'setpoint': 68
-        },
-        {
-            'title': 'Pre-Sleeping',
-            'time_on': '21:44',
-            'time_off': '21:59',
-            'operation': 'heat',
-            'setpoint': 62
-        },
-        {
-            'title': 'Sleeping',
-            'time_on': '21:59',
-            'time_off': '08:59',
-            'operation': 'heat',
-            'setpoint': 62
-        },
-        {
-            'title': 'Day (Away)',
-            'time_on': '08:59',
-            'time_off': '16:29',
-            'if_away': True,
-            'operation': 'heat',
-            'setpoint': 62
-        },
-        {
-            'title': 'Day (Home)',
-            'time_on': '08:59',
-            'time_off': '17:59',
-            'operation': 'heat',
-            'setpoint': 68
-        },
-        {
-            'title': 'Evening (Away)',
-            'time_on': '17:59',
-            'time_off': '21:44',
-            'operation': 'heat',
-            'if_away': True,
-            'setpoint': 62
-        },
-        {
-            'title': 'Evening (Home)',
-            'time_on': '15:59',
-            'time_off': '21:44',
-            'operation': 'heat',
-            'setpoint': 69
-        }
-    ],
-    ('Warm Shoulder', 'climate.master_br'): [
-        {
-            'title': 'Morning (weekday)',
-            'days': 'MTWTF..',
-            'time_on': '05:44',
-            'time_off': '07:59',
-            'operation': 'heat',
-            'setpoint': 67
-        },
-        {
-            'title': 'Morning (weekend)',
-            'days': '.....SS',
-            'time_on': '07:29',
-            'time_off': '08:59',
-            'operation': 'heat',
-            'setpoint': 68
-        },
-        {
-            'title': 'Pre-Sleeping',
-            'time_on': '21:44',
-            'time_off': '21:59',
-            'operation': 'heat',
-            'setpoint': 64
-        },
-        {
-            'title': 'Sleeping',
-            'time_on': '21:59',
-            'time_off': '08:59',
-            'operation': 'heat',
-            'setpoint': 64
-        },
-        {
-            'title': 'Day (Away)',
-            'time_on': '08:59',
-            'time_off': '16:29',
-            'if_away': True,
-            'operation': 'heat',
-            'setpoint': 62
-        },
-        {
-            'title': 'Day (Home)',
-            'time_on': '08:59',
-            'time_off': '17:59',
-            'operation': 'heat',
-            'setpoint': 68
-        },
-        {
-            'title': 'Evening (Away)',
-            'time_on': '17:59',
-            'time_off': '21:44',
-            'operation': 'heat',
-            'if_away': True,
-            'setpoint': 62
-        },
-        {
-            'title': 'Evening (Home)',
-            'time_on': '15:59',
-            'time_off': '21:44',
-            'operation': 'heat',
-            'setpoint': 68
-        }
-    ],
-    ('Warm Shoulder', 'climate.loft'): [
-        {
-            'title': 'Night',
-            'operation': 'heat',
-            'time_on': '00:04',
-            'time_off': '07:29',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 61
-        },
-        {
-            'title': 'Day (Weekday)',
-            'days': 'MTWTF..',
-            'operation': 'heat',
-            'time_on': '07:29',
-            'time_off': '17:59',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 68
-        },
-        {
-            'title': 'Day (Weekend)',
-            'days': '.....SS',
-            'operation': 'heat',
-            'time_on': '08:59',
-            'time_off': '17:59',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 62
-        },
-        {
-            'title': 'Evening',
-            'operation': 'heat',
-            'time_on': '17:59',
-            'time_off': '00:04',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 63
-        }
-    ],
-    ('Normal Summer', 'climate.master_br'): [
-        {
-            'title': 'Dehumidify',
-            'time_on': '19:59',
-            'time_off': '20:59',
-            'operation': 'dry',
-            'humidity_sensor': 'sensor.dewpoint_mbr',
-            'if_humid': 63,
-            'window': 'binary_sensor.bedroom_window',
-        },
-        {
-            'title': 'Sleeping-early',
-            'time_on': '20:59',
-            'time_off': '02:59',
-            'operation': 'cool',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 73
-        },
-        {
-            'title': 'Sleeping-late',
-            'time_on': '02:59',
-            'time_off': '07:59',
-            'operation': 'cool',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 74
-        },
-    ],
-    ('Hot Summer', 'climate.master_br'): [
-        {
-            'title': 'Dehumidify',
-            'time_on': '19:59',
-            'time_off': '20:59',
-            'operation': 'dry',
-            'humidity_sensor': 'sensor.dewpoint_mbr',
-            'if_humid': 63,
-            'window': 'binary_sensor.bedroom_window',
-        },
-        {
-            'title': 'Sleeping-early',
-            'time_on': '20:59',
-            'time_off': '02:59',
-            'operation': 'cool',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 73
-        },
-        {
-            'title': 'Sleeping-late',
-            'time_on': '02:59',
-            'time_off': '07:59',
-            'operation': 'cool',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 74
-        },
-        {
-            'title': 'Day (Away)',
-            'time_on': '08:29',
-            'time_off': '19:44',
-            'operation': 'cool',
-            'window': 'binary_sensor.bedroom_window',
-            'if_away': True,
-            'setpoint': 78
-        },
-        {
-            'title': 'Day (Home)',
-            'time_on': '08:29',
-            'time_off': '19:44',
-            'operation': 'cool',
-            'window': 'binary_sensor.bedroom_window',
-            'setpoint': 76
-        },
-    ],
-    ('Hot Summer', 'climate.loft'): [
-        {
-            'title': 'Night',
-            'operation': 'cool',
-            'time_on': '00:04',
-            'time_off': '08:59',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 83
-        },
-        {
-            'title': 'Day (away)',
-            'operation': 'cool',
-            'time_on': '08:59',
-            'time_off': '17:59',
-            'if_away': True,
-            'window': 'binary_sensor.skylight',
-            'setpoint': 85
-        },
-        {
-            'title': 'Day',
-            'operation': 'cool',
-            'time_on': '08:59',
-            'time_off': '17:59',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 80
-        },
-        {
-            'title': 'Evening',
-            'operation': 'cool',
-            'time_on': '17:59',
-            'time_off': '00:04',
-            'window': 'binary_sensor.skylight',
-            'setpoint': 81
-        }
-    ],
-    ('Hot Summer', 'climate.first_floor'): [
-        {
-            'title': 'Sleeping',
-            'time_on': '21:59',
-            'time_off': '05:59',
-            'window': 'binary_sensor.first_floor_windows',
-            'operation': 'cool',
-            'setpoint': 78
-        },
-        {
-            'title': 'Day (Away)',
-            'time_on': '07:59',
-            'time_off': '15:59',
-            'operation': 'cool',
-            'window': 'binary_sensor.first_floor_windows',
-            'if_away': True,
-            'setpoint': 78
-        },
-        {
-            'title': 'Day (Home)',
-            'time_on': '05:59',
-            'time_off': '15:59',
-            'window': 'binary_sensor.first_floor_windows',
-            'operation': 'cool',
-            'setpoint': 75
-        },
-        {
-            'title': 'Evening (Away)',
-            'time_on': '17:59',
-            'time_off': '21:44',
-            'operation': 'cool',
-            'window': 'binary_sensor.first_floor_windows',
-            'if_away': True,
-            'setpoint': 78
-        },
-        {
-            'title': 'Evening (Home)',
-            'time_on': '15:59',
-            'time_off': '21:44',
-            'window': 'binary_sensor.first_floor_windows',
-            'operation': 'cool',
-            'setpoint': 75
+# Schedules may also be given inline here, keyed by (global mode, climate unit)
+# tuples, e.g. {('Winter', 'climate.master_br'): [{...}, ...]}. They are only
+# used when the 'seasons' input is not given.
+SEASONS = {}
+
+ALL_DAYS = 0x7f
+MINUTES_PER_DAY = 1440
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def minute_of_day(time_str):
+    # 'HH:MM' to minutes since midnight. Split by hand: strptime was most of
+    # the cost of compiling a schedule.
+    if not time_str:
+        return None
+    hours, minutes = time_str.split(':')
+    if not (0 <= int(hours) < 24 and 0 <= int(minutes) < 60):
+        raise ValueError("Invalid time {}".format(time_str))
+    return int(hours) * 60 + int(minutes)
+
+def day_mask(days):
+    # Bit N set means the schedule may start on weekday N (Monday is 0)
+    if not days or len(days) != 7:
+        return ALL_DAYS
+    mask = 0
+    for day, flag in enumerate(days):
+        if flag != '-' and flag != '.':
+            mask = mask | (1 << day)
+    return mask
+
+def normalize_setpoint(setpoint):
+    if not setpoint:
+        return None
+    if '.' in str(setpoint):
+        return float(setpoint)
+    return int(setpoint)
+
+def compile_schedule(schedule):
+    # Parse one SEASONS entry into the record the evaluation loop works on:
+    # integer minute-of-day boundaries, a weekday bitmask and normalized
+    # values, so a run only compares integers.
+    time_on = minute_of_day(schedule.get('time_on'))
+    time_off = minute_of_day(schedule.get('time_off'))
+    if time_on is None or time_off is None:
+        time_on = None
+        time_off = None
+    presence = None
+    if schedule.get('if_home'):
+        presence = 'home'
+    if schedule.get('if_away'):
+        presence = 'away'
+    humidity_sensor = None
+    if_humid = None
+    if_humid_release = None
+    if schedule.get('humidity_sensor') and schedule.get('if_humid'):
+        humidity_sensor = schedule['humidity_sensor']
+        if_humid = float(schedule['if_humid'])
+        if schedule.get('if_humid_release'):
+            if_humid_release = float(schedule['if_humid_release'])
+    return {
+        'title': schedule.get('title'),
+        'time_on': time_on,
+        'time_off': time_off,
+        'days': day_mask(schedule.get('days')),
+        'presence': presence,
+        'humidity_sensor': humidity_sensor,
+        'if_humid': if_humid,
+        'if_humid_release': if_humid_release,
+        'window': schedule.get('window'),
+        'operation': schedule.get('operation'),
+        'setpoint': normalize_setpoint(schedule.get('setpoint')),
+        'state': "%s-%s" % (str(schedule.get('operation')),
+                            str(schedule.get('setpoint')))
+    }
+
+def schedule_intervals(record):
+    # The [start, end) minute-of-week ranges in which the schedule's time and
+    # day window is open. A schedule crossing midnight belongs to the day it
+    # starts on; ranges running past the end of the week wrap to Monday.
+    intervals = []
+    for day in range(7):
+        if not record['days'] & (1 << day):
+            continue
+        start = day * MINUTES_PER_DAY
+        if (record['time_on'] is None or
+                record['time_on'] == record['time_off']):
+            end = start + MINUTES_PER_DAY
+        else:
+            end = start + record['time_off']
+            start = start + record['time_on']
+            if record['time_on'] > record['time_off']:
+                end = end + MINUTES_PER_DAY
+        if end > MINUTES_PER_WEEK:
+            intervals.append([start, MINUTES_PER_WEEK])
+            intervals.append([0, end - MINUTES_PER_WEEK])
+        else:
+            intervals.append([start, end])
+    return intervals
+
+def sweep_intervals(intervals, limit):
+    # Split [0, limit) into segments within which the set of open intervals
+    # does not change. intervals[i] lists record i's [start, end) ranges;
+    # each segment keeps the indexes of the records open in it, in order,
+    # so finding them for a point is a binary search however many records
+    # there are. limit None means no limit.
+    changes = {0: []}
+    for i, ranges in enumerate(intervals):
+        for start, end in ranges:
+            changes.setdefault(start, []).append([i, 1])
+            changes.setdefault(end, []).append([i, -1])
+    open_count = [0 for ranges in intervals]
+    starts = []
+    candidates = []
+    for position in sorted(changes):
+        if limit is not None and position >= limit:
+            break
+        for i, change in changes[position]:
+            open_count[i] = open_count[i] + change
+        active = [i for i in range(len(intervals)) if open_count[i]]
+        if candidates and candidates[-1] == active:
+            continue
+        starts.append(position)
+        candidates.append(active)
+    return {'starts': starts, 'candidates': candidates}
+
+def build_index(records):
+    # Segments of the week within which the set of schedules whose time and
+    # day window is open does not change
+    return sweep_intervals([schedule_intervals(record) for record in records],
+                           MINUTES_PER_WEEK)
+
+def find_segment(starts, minute_of_week):
+    # Rightmost segment starting at or before minute_of_week
+    low = 0
+    high = len(starts)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if starts[middle] <= minute_of_week:
+            low = middle
+        else:
+            high = middle
+    return low
+
+def local_instant(day, minute, tz):
+    # Epoch minute at which the wall clock in tz reads minute (of the day) on
+    # date day. A time skipped when the clocks go forward maps to the moment
+    # they jump, and a time repeated when they go back to its first
+    # occurrence, so every transition happens exactly once.
+    wanted = datetime.datetime(day.year, day.month, day.day, minute // 60,
+                               minute % 60, tzinfo=tz)
+    instant = int(wanted.timestamp()) // 60
+    naive = wanted.replace(tzinfo=None)
+    while (datetime.datetime.fromtimestamp((instant - 1) * 60, tz)
+           .replace(tzinfo=None) > naive):
+        instant = instant - 1
+    return instant
+
+def build_calendar(index, day, tz):
+    # The index segments of one local day as {'instants', 'segments'}:
+    # sorted epoch minutes from midnight on, each with the segment that
+    # starts then
+    day_start = day.weekday() * MINUTES_PER_DAY
+    instants = [local_instant(day, 0, tz)]
+    segments = [find_segment(index['starts'], day_start)]
+    for segment, start in enumerate(index['starts']):
+        if day_start < start < day_start + MINUTES_PER_DAY:
+            instant = local_instant(day, start - day_start, tz)
+            if instant == instants[-1]:
+                # Both fell into a skipped hour; the later one stands
+                segments[-1] = segment
+                continue
+            instants.append(instant)
+            segments.append(segment)
+    return {'instants': instants, 'segments': segments}
+
+def expand_schedules(schedules, templates, using):
+    # A key's schedules with each {'use': name, ...} entry replaced by the
+    # template's list of schedules, the entry's other fields overriding
+    # theirs. A template's name alone stands for {'use': name}. using lists
+    # the templates being expanded, to stop one using itself.
+    if not schedules:
+        return []
+    if isinstance(schedules, str):
+        schedules = [schedules]
+    expanded = []
+    for schedule in schedules:
+        if isinstance(schedule, str):
+            schedule = {'use': schedule}
+        name = schedule.get('use')
+        if name is None:
+            expanded.append(schedule)
+            continue
+        if name not in templates or name in using:
+            logger.warning("Unknown or recursive schedule template {}".format(
+                name))
+            continue
+        fields = {field: value for field, value in schedule.items()
+                  if field != 'use'}
+        for inherited in expand_schedules(templates[name], templates,
+                                          using + [name]):
+            if fields:
+                inherited = {field: value
+                             for field, value in inherited.items()}
+                inherited.update(fields)
+            expanded.append(inherited)
+    return expanded
+
+def load_seasons(source):
+    # {mode: {unit: [schedule, ...]}}, as read from seasons.yaml, to the
+    # SEASONS layout, with templates expanded
+    templates = source.get('templates') or {}
+    return {(mode, climate_unit): expand_schedules(schedules, templates, [])
+            for mode, units in source.items() if mode != 'templates'
+            for climate_unit, schedules in units.items()}
+
+# The seasons input as given to the script, used in place of SEASONS
+# without going through all of it: each key is looked up, and its templates
+# expanded, as it is compiled
+SEASONS_INPUT = {}
+
+def input_keys():
+    return [(mode, climate_unit) for mode in SEASONS_INPUT
+            if mode != 'templates'
+            for climate_unit in SEASONS_INPUT[mode] or {}]
+
+def known_key(key):
+    # Whether key is in SEASONS or the seasons input, if only with an empty
+    # list
+    if key in SEASONS:
+        return True
+    if key[0] == 'templates':
+        return False
+    return key[1] in (SEASONS_INPUT.get(key[0]) or {})
+
+# Bumped whenever the compiled record layout changes, so a cache_entity
+# written by an older version of this script is rebuilt
+RECORD_FORMAT = 4
+
+# Each distinct compiled record is kept once, however many keys list it, and
+# keys whose records are the same share one table, [record numbers, index],
+# and its calendars. Records and tables are numbered in the order first
+# seen, and keys maps mode and unit to a table: {mode: {unit: table}}. All
+# three are plain lists and dicts, so they can be saved and used again as
+# they are. complete is set when they were taken over whole, from the cache
+# or another engine, and SEASONS may not have been expanded at all.
+def new_interned():
+    return {'records': [], 'tables': [], 'keys': {}, 'complete': False,
+            'record_numbers': {}, 'table_numbers': {}, 'sources': {},
+            'table_records': {}, 'digests': {}}
+
+INTERNED = new_interned()
+# Calendars by [table number, local date in ISO format]
+CALENDARS = {}
+# Whether lookups go through the index and calendars, which pay off where
+# they are kept: in a long-lived engine, or in cache_entity. Otherwise each
+# lookup checks the key's records straight.
+INDEXED = True
+
+def forget_compiled():
+    CALENDARS.clear()
+    INTERNED.update(new_interned())
+
+def intern_record(record):
+    signature = repr(record)
+    numbers = INTERNED['record_numbers']
+    if signature not in numbers:
+        numbers[signature] = len(INTERNED['records'])
+        INTERNED['records'].append(record)
+    return numbers[signature]
+
+def intern_table(numbers, index):
+    # Number of the table of records numbers, added with index (None until
+    # schedule_index() builds it) if no key had it yet
+    signature = repr(numbers)
+    tables = INTERNED['table_numbers']
+    if signature not in tables:
+        tables[signature] = len(INTERNED['tables'])
+        INTERNED['tables'].append([numbers, index])
+    return tables[signature]
+
+def use_table(key, table):
+    INTERNED['keys'].setdefault(key[0], {})[key[1]] = table
+
+def compile_key(key):
+    # Each key is compiled at most once per run, however many units or
+    # events end up evaluating it, and where lookups are indexed, each
+    # distinct schedule once for all keys.
+    sources = INTERNED['sources']
+    numbers = []
+    if key in SEASONS:
+        schedules = SEASONS[key]
+    else:
+        schedules = expand_schedules(SEASONS_INPUT[key[0]][key[1]],
+                                     SEASONS_INPUT.get('templates') or {},
+                                     [])
+    for schedule in schedules or []:
+        if not INDEXED:
+            # A run that keeps nothing looks few keys up, and seldom
+            # shares a schedule between them
+            numbers.append(len(INTERNED['records']))
+            INTERNED['records'].append(compile_schedule(schedule))
+            continue
+        signature = repr(schedule)
+        if signature not in sources:
+            sources[signature] = intern_record(compile_schedule(schedule))
+        numbers.append(sources[signature])
+    use_table(key, intern_table(numbers, None))
+
+def compiled_form():
+    # Every key compiled and indexed, as save_compiled() keeps it and
+    # adopt_compiled() takes it back
+    for key in schedule_keys():
+        schedule_index(key)
+    return {'records': INTERNED['records'], 'tables': INTERNED['tables'],
+            'keys': INTERNED['keys']}
+
+def adopt_compiled(compiled):
+    # Use a compiled_form() as it is; keys look their table up when needed
+    INTERNED.update(new_interned())
+    INTERNED['records'] = compiled['records']
+    INTERNED['tables'] = compiled['tables']
+    INTERNED['keys'] = compiled['keys']
+    INTERNED['complete'] = True
+
+def schedule_keys():
+    # Every (mode, unit) with schedules
+    if INTERNED['complete']:
+        return [(mode, climate_unit)
+                for mode, tables in INTERNED['keys'].items()
+                for climate_unit in tables]
+    return [key for key in SEASONS] + input_keys()
+
+def key_table(key):
+    # Number of key's table, compiling key on first use; None for a key
+    # without schedules
+    if key[1] not in INTERNED['keys'].get(key[0], {}):
+        if INTERNED['complete'] or not known_key(key):
+            return None
+        compile_key(key)
+    return INTERNED['keys'][key[0]][key[1]]
+
+def compiled_schedules(key):
+    table = key_table(key)
+    if table is None:
+        return []
+    # Keys sharing a table share its record list too
+    table_records = INTERNED['table_records']
+    if table not in table_records:
+        table_records[table] = [INTERNED['records'][number]
+                                for number in INTERNED['tables'][table][0]]
+    return table_records[table]
+
+def schedule_index(key):
+    table = key_table(key)
+    if table is None:
+        return build_index([])
+    if INTERNED['tables'][table][1] is None:
+        INTERNED['tables'][table][1] = build_index(compiled_schedules(key))
+    return INTERNED['tables'][table][1]
+
+def schedules_digest(key):
+    # Hash of key's compiled schedules, so a decision is taken again when
+    # they change, but not when another key's do
+    table = key_table(key)
+    digests = INTERNED['digests']
+    if table not in digests:
+        digests[table] = hash(repr(compiled_schedules(key)))
+    return digests[table]
+
+def day_calendar(key, day, tz):
+    # Built once per table and local day
+    calendar_key = (key_table(key), day.isoformat())
+    if calendar_key not in CALENDARS:
+        count('calendars_built')
+        CALENDARS[calendar_key] = build_calendar(schedule_index(key), day, tz)
+    return CALENDARS[calendar_key]
+
+def forget_calendars_before(day):
+    for calendar_key in [calendar_key for calendar_key in CALENDARS
+                         if calendar_key[1] < day.isoformat()]:
+        del CALENDARS[calendar_key]
+
+def schedule_position(key, now):
+    # (index segment in force at the timezone-aware local time now, minutes
+    # until its candidate schedules next change, or None if they never do)
+    index = schedule_index(key)
+    epoch_minute = int(now.timestamp()) // 60
+    day = now.date()
+    calendar = day_calendar(key, day, now.tzinfo)
+    position = find_segment(calendar['instants'], epoch_minute)
+    segment = calendar['segments'][position]
+    candidates = index['candidates'][segment]
+    if len(index['starts']) == 1:
+        return (segment, None)
+    # A week from now the same segments come round again
+    for days_ahead in range(8):
+        if days_ahead:
+            calendar = day_calendar(
+                key, day + datetime.timedelta(days=days_ahead), now.tzinfo)
+            position = -1
+        for following in range(position + 1, len(calendar['instants'])):
+            if (index['candidates'][calendar['segments'][following]] !=
+                    candidates):
+                return (segment,
+                        calendar['instants'][following] - epoch_minute)
+    return (segment, None)
+
+def window_position(record, weekday, minute):
+    # (whether record's time and day window is open at minute of the day on
+    # weekday, minutes until it next opens or closes, or None if it never
+    # does), by the clock
+    days = record['days']
+    time_on = record['time_on']
+    if time_on is None or time_on == record['time_off']:
+        is_open = bool(days & (1 << weekday))
+        for ahead in range(1, 8):
+            if bool(days & (1 << ((weekday + ahead) % 7))) != is_open:
+                return (is_open, ahead * MINUTES_PER_DAY - minute)
+        return (is_open, None)
+    length = (record['time_off'] - time_on) % MINUTES_PER_DAY
+    is_open = False
+    following = None
+    # From yesterday's window, which may run past midnight, on
+    for ahead in range(-1, 8):
+        if not days & (1 << ((weekday + ahead) % 7)):
+            continue
+        start = ahead * MINUTES_PER_DAY + time_on
+        if start <= minute < start + length:
+            is_open = True
+        for change in [start, start + length]:
+            if change > minute and (following is None or change < following):
+                following = change
+        if following is not None and start > minute:
+            break
+    if following is None:
+        return (is_open, None)
+    return (is_open, following - minute)
+
+def scan_schedules(key, now):
+    # schedule_position() straight off key's records, for a run that looks
+    # it up once: (numbers of the records whose time and day window is open
+    # at the timezone-aware local time now, minutes until that changes, or
+    # None if it never does). None in the hour repeated when the clocks go
+    # back, if a change in it has passed.
+    epoch_minute = int(now.timestamp()) // 60
+    day = now.date()
+    minute = now.hour * 60 + now.minute
+    open_now = []
+    ahead = None
+    for number, record in enumerate(compiled_schedules(key)):
+        is_open, following = window_position(record, day.weekday(), minute)
+        if is_open:
+            open_now.append(number)
+        if following is not None and (ahead is None or following < ahead):
+            ahead = following
+    if ahead is None:
+        return (open_now, None)
+    following = minute + ahead
+    boundary = local_instant(
+        day + datetime.timedelta(days=following // MINUTES_PER_DAY),
+        following % MINUTES_PER_DAY, now.tzinfo) - epoch_minute
+    if boundary <= 0:
+        return None
+    return (open_now, boundary)
+
+def schedule_candidates(key, now):
+    # (numbers of key's schedules whose time and day window is open at now,
+    # minutes until that changes, or None)
+    if not INDEXED:
+        position = scan_schedules(key, now)
+        if position:
+            return position
+    # The calendar has each change at its first occurrence
+    segment, boundary = schedule_position(key, now)
+    return (schedule_index(key)['candidates'][segment], boundary)
+
+# Compiled overrides, the interval index of those for each unit, and a hash
+# of their source
+OVERRIDES = {'records': [], 'indexes': {}, 'hash': None}
+
+def override_instant(value, tz, is_end):
+    # Epoch minute of an override's start or end: 'YYYY-MM-DD HH:MM', or a
+    # date alone, meaning midnight at the start (or, for an end, the end) of
+    # that day. YAML may hand over date or datetime objects for either.
+    text = str(value)
+    day = datetime.date.fromisoformat(text[:10])
+    if len(text) > 10:
+        return local_instant(day, minute_of_day(text[11:16]), tz)
+    if is_end:
+        day = day + datetime.timedelta(days=1)
+    return local_instant(day, 0, tz)
+
+def compile_override(override, tz):
+    record = compile_schedule(override)
+    record['start'] = override_instant(override['start'], tz, False)
+    record['end'] = override_instant(override['end'], tz, True)
+    record['units'] = override.get('units', 'all')
+    # A single mode, like a single unit, may be given without a list
+    modes = override.get('modes')
+    if isinstance(modes, str):
+        modes = [modes]
+    record['modes'] = modes
+    return record
+
+def load_overrides(source, tz):
+    OVERRIDES['records'] = [compile_override(override, tz)
+                            for override in source or []]
+    OVERRIDES['indexes'] = {}
+    OVERRIDES['hash'] = hash(repr(source))
+
+def override_applies_to(record, climate_unit):
+    units = record['units']
+    if units == 'all':
+        return True
+    if isinstance(units, str):
+        return units == climate_unit
+    return climate_unit in units
+
+def override_index(climate_unit):
+    # The unit's overrides, in the order given, and the segments of time
+    # within which the set of them in effect does not change
+    indexes = OVERRIDES['indexes']
+    if climate_unit not in indexes:
+        records = [record for record in OVERRIDES['records']
+                   if override_applies_to(record, climate_unit)]
+        index = sweep_intervals([[[record['start'], record['end']]]
+                                 for record in records], None)
+        index['records'] = records
+        indexes[climate_unit] = index
+    return indexes[climate_unit]
+
+def active_override(climate_unit, current_mode, now):
+    # (the first override of the unit in effect at now in current_mode or
+    # None, minutes until the unit's overrides next change or None)
+    index = override_index(climate_unit)
+    if not index['records']:
+        return (None, None)
+    epoch_minute = int(now.timestamp()) // 60
+    starts = index['starts']
+    segment = find_segment(starts, epoch_minute)
+    boundary = None
+    if segment + 1 < len(starts):
+        boundary = starts[segment + 1] - epoch_minute
+    for position in index['candidates'][segment]:
+        record = index['records'][position]
+        if not record['modes'] or current_mode in record['modes']:
+            return (record, boundary)
+    return (None, boundary)
+
+def load_calendars(cache_entity, day):
+    # Today's calendars, if an earlier run built them
+    cached = hass.states.get(cache_entity)
+    if not cached or cached.attributes.get('calendar_day') != day.isoformat():
+        return
+    for table, calendar_day, calendar in cached.attributes.get('calendars',
+                                                               []):
+        CALENDARS[(table, calendar_day)] = calendar
+
+def save_calendars(cache_entity, day):
+    cached = hass.states.get(cache_entity)
+    attributes = {name: value for name, value in cached.attributes.items()}
+    attributes['calendar_day'] = day.isoformat()
+    attributes['calendars'] = [
+        [calendar_key[0], calendar_key[1], calendar]
+        for calendar_key, calendar in CALENDARS.items()
+        if calendar_key[1] >= day.isoformat()]
+    hass.states.set(cache_entity, cached.state, attributes)
+
+def load_compiled(cache_entity, source):
+    # Take over the schedules an earlier run compiled from the same source,
+    # the seasons input as given (compared, not hashed, which would mean
+    # going through all of it every run). Returns whether it could.
+    cached = hass.states.get(cache_entity)
+    if not cached or cached.attributes.get('format') != RECORD_FORMAT or \
+            cached.attributes.get('seasons') != source:
+        return False
+    adopt_compiled(cached.attributes)
+    return True
+
+def save_compiled(cache_entity, source):
+    attributes = compiled_form()
+    attributes['seasons'] = source
+    attributes['format'] = RECORD_FORMAT
+    hass.states.set(cache_entity, len(schedule_keys()), attributes)
+
+def new_snapshot(store):
+    # Entity states read during a run. Each entity is fetched from the state
+    # machine (or any object with a get(entity_id) method) at most once and
+    # numeric values are parsed at most once, however many schedules or
+    # units refer to them.
+    return {'store': store, 'states': {}, 'numbers': {}, 'reads': 0}
+
+def snapshot_state(snapshot, entity_id):
+    states = snapshot['states']
+    if entity_id not in states:
+        states[entity_id] = snapshot['store'].get(entity_id)
+        snapshot['reads'] = snapshot['reads'] + 1
+    return states[entity_id]
+
+def new_metrics():
+    return {
+        'units_evaluated': 0,
+        'units_short_circuited': 0,
+        'units_deferred': 0,
+        'schedules_scanned': 0,
+        'entity_reads': 0,
+        'calls_issued': 0,
+        'calls_skipped': 0,
+        'calls_superseded': 0,
+        'calls_merged': 0,
+        'wait_ms': 0,
+        'calendars_built': 0
+    }
+
+METRICS = new_metrics()
+
+def count(name, amount=1):
+    METRICS[name] = METRICS[name] + amount
+
+def metrics_since(before, snapshot, reads_before):
+    counters = {name: METRICS[name] - before[name] for name in METRICS}
+    counters['entity_reads'] = snapshot['reads'] - reads_before
+    return counters
+
+def publish_metrics(entity_id, counters, elapsed, schedules):
+    # Wall time in ms as the state so it graphs in the recorder, with the
+    # counters and the matched schedule titles as attributes
+    attributes = {name: value for name, value in counters.items()}
+    attributes['schedules'] = schedules
+    attributes['unit_of_measurement'] = 'ms'
+    hass.states.set(entity_id, round(elapsed * 1000, 1), attributes)
+
+def snapshot_number(snapshot, entity_id):
+    numbers = snapshot['numbers']
+    if entity_id not in numbers:
+        numbers[entity_id] = float(snapshot_state(snapshot, entity_id).state)
+    return numbers[entity_id]
+
+def all_units():
+    # Every unit with a schedule in any global mode, so a unit without a key
+    # in the current mode still falls through to 'Default (Off)', and every
+    # unit an override names
+    units = set(unit for (mode, unit) in schedule_keys())
+    for record in OVERRIDES['records']:
+        if isinstance(record['units'], str) and record['units'] != 'all':
+            units.add(record['units'])
+        elif record['units'] != 'all':
+            units.update(record['units'])
+    return sorted(units)
+
+def schedule_inputs(record, at_home_sensor):
+    inputs = []
+    if record['window']:
+        inputs.append(record['window'])
+    if record['humidity_sensor']:
+        inputs.append(record['humidity_sensor'])
+    if record['presence'] and at_home_sensor:
+        inputs.append(at_home_sensor)
+    return inputs
+
+def dependency_index(at_home_sensor):
+    # Map each input entity to the units whose schedules read it, per global
+    # mode: {entity_id: {mode: [climate_unit, ...]}}
+    index = {}
+    for key in schedule_keys():
+        mode, climate_unit = key
+        for record in compiled_schedules(key):
+            for entity_id in schedule_inputs(record, at_home_sensor):
+                units = index.setdefault(entity_id, {}).setdefault(mode, [])
+                if climate_unit not in units:
+                    units.append(climate_unit)
+    # Overrides may apply in any mode; their units are kept under None
+    for record in OVERRIDES['records']:
+        for entity_id in schedule_inputs(record, at_home_sensor):
+            units = index.setdefault(entity_id, {}).setdefault(None, [])
+            for climate_unit in all_units():
+                if (override_applies_to(record, climate_unit) and
+                        climate_unit not in units):
+                    units.append(climate_unit)
+    return index
+
+def dependent_units(dependencies, changed_entity, current_mode):
+    # Units to re-evaluate when changed_entity changes state, given the
+    # dependency_index(). A global mode change affects every unit, including
+    # those with no key in the new mode.
+    if changed_entity == data.get('global_mode'):
+        return all_units()
+    index = dependencies.get(changed_entity, {})
+    return sorted(set(index.get(current_mode, []) + index.get(None, [])))
+
+def unit_state_entity(state_entity, climate_unit):
+    # In batch runs state_entity may contain '{}', replaced by the unit's
+    # object id, e.g. input_text.seasons_{} -> input_text.seasons_master_br
+    return state_entity.replace('{}', climate_unit.split('.', 1)[1])
+
+def presence_matches(schedule, is_home):
+    if schedule['presence'] == 'home':
+        return is_home
+    if schedule['presence'] == 'away':
+        return not is_home
+    return True
+
+def input_value(snapshot, entity_id, threshold):
+    # What a schedule makes of an input: window open, or humidity below
+    # the if_humid threshold
+    if threshold is None:
+        return snapshot_state(snapshot, entity_id).state == 'on'
+    return snapshot_number(snapshot, entity_id) < threshold
+
+def humid_threshold(schedule, latched):
+    # if_humid, or if_humid_release while the schedule holds the latch
+    if latched and schedule['if_humid_release'] is not None:
+        return schedule['if_humid_release']
+    return schedule['if_humid']
+
+def evaluate_unit(climate_unit, current_mode, is_home, saved_state,
+                  from_timer, now, snapshot, humid_latch=None, quiet=False):
+    # humid_latch is the index of the schedule in this mode ('override' for
+    # an override) that held the humidity latch after the last run, if any.
+    # quiet leaves out the info line for a key without schedules.
+    key = (current_mode, climate_unit)
+    schedules = compiled_schedules(key)
+
+    matched = False
+    setpoint = None
+    turn_off = False
+    desired_operation = None
+    title = None
+    next_state = None
+    boundary = None
+    matched_schedule = None
+    window_open = False
+    inputs = []
+    # A dated override in effect comes before every schedule of the mode
+    override, override_boundary = active_override(climate_unit, current_mode,
+                                                  now)
+    candidates = []
+    if override:
+        candidates.append(['override', override])
+    if not schedules:
+        if not quiet:
+            logger.info("No schedules for {}".format(key))
+    else:
+        numbers, boundary = schedule_candidates(key, now)
+        candidates.extend([[candidate, schedules[candidate]]
+                           for candidate in numbers])
+    if override_boundary is not None and (boundary is None or
+                                          override_boundary < boundary):
+        boundary = override_boundary
+    matched_record = None
+    for candidate, schedule in candidates:
+        count('schedules_scanned')
+        # Time and day were settled by the index. Of what's left, check
+        # presence before the humidity gate, which needs a state lookup,
+        # and stop at the first test that fails.
+        if not presence_matches(schedule, is_home):
+            continue
+        hs = schedule['humidity_sensor']
+        if hs:
+            threshold = humid_threshold(schedule,
+                                        candidate == humid_latch)
+            inputs.append([hs, threshold])
+            if input_value(snapshot, hs, threshold):
+                continue
+        # When we get here, we have schedules for this unit and
+        # global mode and we're in this schedule's interval.
+        # We will obey this schedule and ignore subsequent matches
+        matched_schedule = candidate
+        matched_record = schedule
+        if schedule['window']:
+            inputs.append([schedule['window'], None])
+            window_open = snapshot_state(
+                snapshot, schedule['window']).state == 'on'
+
+        decided = False
+        matched = True
+        next_state = schedule['state']
+        same_next_state = (next_state == saved_state)
+        if window_open:
+            # Off if window is open
+            turn_off = True
+            title = schedule['title'] + ' (Window open)'
+            decided = True
+        if (not decided) and from_timer and (not same_next_state):
+            desired_operation = schedule['operation']
+            if desired_operation == 'off':
+                turn_off = True
+            setpoint = schedule['setpoint']
+            title = schedule['title']
+            decided = True
+        if not decided and (not from_timer):
+            desired_operation = schedule['operation']
+            if desired_operation == 'off':
+                turn_off = True
+            setpoint = schedule['setpoint']
+            title = schedule['title']
+            decided = True
+        break
+
+    if not matched and current_mode != "Manual":
+        # If no schedules matched, turn off except in Manual
+        next_state = "off-None"
+        same_next_state = (next_state == saved_state)
+        if (not from_timer) or (not same_next_state):
+            turn_off = True
+            title = 'Default (Off)'
+
+    if turn_off:
+        desired_operation = 'off'
+
+    latch = None
+    if matched_record and matched_record['if_humid_release'] is not None:
+        latch = matched_schedule
+
+    return {
+        'climate_unit': climate_unit,
+        'operation': desired_operation,
+        'setpoint': setpoint,
+        'title': title,
+        'next_state': next_state,
+        'next_boundary': boundary,
+        'schedule': matched_schedule,
+        'window_open': window_open,
+        'humid_latch': latch,
+        'inputs': inputs
+    }
+
+def inputs_digest(key, is_home, inputs, snapshot):
+    # Hash of everything a decision depended on besides the time: the
+    # schedules themselves, presence and the inputs the matcher consulted
+    values = [input_value(snapshot, entity_id, threshold)
+              for entity_id, threshold in inputs]
+    return hash((key, schedules_digest(key), OVERRIDES['hash'], is_home,
+                 tuple(values)))
+
+def fingerprint(decision, key, is_home, now_epoch_minute, snapshot):
+    until = None
+    if decision['next_boundary'] is not None:
+        until = now_epoch_minute + decision['next_boundary']
+    return {
+        'schedule': decision['schedule'],
+        'window_open': decision['window_open'],
+        'until': until,
+        'inputs': inputs_digest(key, is_home, decision['inputs'], snapshot),
+        'depends': decision['inputs']
+    }
+
+def fingerprint_holds(last, key, is_home, now_epoch_minute, snapshot):
+    # Before the next schedule boundary, and with the same inputs, a
+    # decision still stands
+    if last['until'] is not None and now_epoch_minute >= last['until']:
+        return False
+    return last['inputs'] == inputs_digest(key, is_home, last['depends'],
+                                           snapshot)
+
+def unchanged_since_last_run(state, key, is_home, now_epoch_minute,
+                             snapshot):
+    # Fast path for timer runs
+    last = state.attributes.get('fingerprint')
+    if not last:
+        return False
+    # An open window turns the unit off on every run, timer or not
+    if last['window_open']:
+        return False
+    return fingerprint_holds(last, key, is_home, now_epoch_minute, snapshot)
+
+def all_modes():
+    return sorted(set(mode for (mode, unit) in schedule_keys()))
+
+def mode_table(climate_units, is_home, now, now_epoch_minute, snapshot,
+               table):
+    # What an event run would decide now for every unit in every global
+    # mode, so a global_mode change is a lookup: {mode: {unit: entry}}.
+    # Entries of the previous table that still hold are kept, so refreshing
+    # only re-evaluates what time or an input change has invalidated.
+    refreshed = {}
+    for mode in all_modes():
+        entries = table.get(mode, {})
+        refreshed[mode] = {}
+        for climate_unit in climate_units:
+            key = (mode, climate_unit)
+            entry = entries.get(climate_unit)
+            # A unit whose inputs cannot be read gets no entry, and is
+            # evaluated when it is needed
+            try:
+                if entry and fingerprint_holds(entry['fingerprint'], key,
+                                               is_home, now_epoch_minute,
+                                               snapshot):
+                    refreshed[mode][climate_unit] = entry
+                    continue
+                # Most modes have no schedules for most units; that is no
+                # news for modes nobody is in
+                decision = evaluate_unit(climate_unit, mode, is_home, None,
+                                         False, now, snapshot, quiet=True)
+                refreshed[mode][climate_unit] = {
+                    'decision': decision,
+                    'fingerprint': fingerprint(decision, key, is_home,
+                                               now_epoch_minute, snapshot)
+                }
+            except Exception as error:
+                logger.debug("No table entry for {}: {}".format(key, error))
+    return refreshed
+
+def table_decision(table, current_mode, climate_unit, is_home,
+                   now_epoch_minute, snapshot):
+    # The decision from mode_table() for an event run, if it still holds,
+    # else None
+    entry = table.get(current_mode, {}).get(climate_unit)
+    if not entry or not fingerprint_holds(
+            entry['fingerprint'], (current_mode, climate_unit), is_home,
+            now_epoch_minute, snapshot):
+        return None
+    decision = {name: value for name, value in entry['decision'].items()}
+    if entry['fingerprint']['until'] is not None:
+        decision['next_boundary'] = (entry['fingerprint']['until'] -
+                                     now_epoch_minute)
+    return decision
+
+def set_next_transition(entity_id, when):
+    # Point an input_datetime at the next transition so a one-shot time
+    # trigger can replace polling
+    # input_datetime holds local wall time
+    value = when.replace(tzinfo=None).isoformat(' ')
+    current = hass.states.get(entity_id)
+    if current and current.state == value:
+        return
+    hass.services.call('input_datetime', 'set_datetime',
+                       {"entity_id": entity_id, "datetime": value}, False)
+
+def parse_transition(text, tz):
+    # An ISO time, a naive one being local, or None if text is not one
+    try:
+        when = datetime.datetime.fromisoformat(str(text))
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=tz)
+    return when
+
+def earliest_of_all(earliest, covered, snapshot, now):
+    # A shared next_transition_entity holds the earliest transition of all
+    # units, but a run only worked out those of the units it covered. The
+    # others' are their state_entity's next_transition (or the end of a
+    # pending debounce window). When state_entity has no '{}' to tell them
+    # apart, the entity keeps its value while that is earlier and still to
+    # come.
+    others = [unit for unit in all_units() if unit not in covered]
+    if not others:
+        return earliest
+    upcoming = []
+    state_entity = data.get('state_entity')
+    if '{}' in state_entity:
+        for climate_unit in others:
+            state = snapshot_state(snapshot,
+                                   unit_state_entity(state_entity,
+                                                     climate_unit))
+            if not state:
+                continue
+            upcoming.append(parse_transition(
+                state.attributes.get('next_transition'), now.tzinfo))
+            if state.attributes.get('pending') and data.get('debounce'):
+                upcoming.append(datetime.datetime.fromtimestamp(
+                    state.attributes['last_evaluated'] + data['debounce'],
+                    now.tzinfo))
+    else:
+        current = snapshot_state(snapshot, data['next_transition_entity'])
+        if current:
+            upcoming.append(parse_transition(current.state, now.tzinfo))
+    for when in upcoming:
+        if when and when > now and (not earliest or when < earliest):
+            earliest = when
+    return earliest
+
+def reconcile(desired_operation, setpoint, climate_state):
+    # Work out which of hvac_mode / temperature the unit isn't already at
+    if not climate_state:
+        return (True, bool(setpoint))
+    mode_differs = climate_state.state != desired_operation
+    temperature_differs = False
+    if setpoint and desired_operation != 'off':
+        current = climate_state.attributes.get('temperature')
+        temperature_differs = (current is None or
+                               float(current) != float(setpoint))
+    return (mode_differs, temperature_differs)
+
+def debounce_until(state, debounce, from_timer, now_seconds):
+    # End of the unit's quiet window if this run has to leave it pending,
+    # else None. Event runs within the window are deferred; timer runs only
+    # while an event is pending, so they cannot overtake it.
+    last = state.attributes.get('last_evaluated')
+    if last is None or now_seconds >= last + debounce:
+        return None
+    if from_timer and not state.attributes.get('pending'):
+        return None
+    return last + debounce
+
+def save_state(state_entity, state, value, changes):
+    # Write the unit's state_entity, keeping attributes not in changes
+    attributes = {}
+    if state:
+        attributes = {name: attribute
+                      for name, attribute in state.attributes.items()}
+    for name, change in changes.items():
+        attributes[name] = change
+    hass.states.set(state_entity, value, attributes)
+
+def throttle_group(entity_id, throttle):
+    # Longest throttle prefix matching entity_id, or None
+    group = None
+    for prefix in throttle:
+        if entity_id.startswith(prefix) and (group is None or
+                                             len(prefix) > len(group)):
+            group = prefix
+    return group
+
+def queue_command(queue, decision, service, service_data, save):
+    # One command per unit; a newer decision for the unit replaces it. save
+    # is the unit's state_entity write, made once the call has gone out.
+    queue[decision['climate_unit']] = {
+        'urgent': decision['window_open'],
+        'service': service,
+        'service_data': service_data,
+        'save': save
+    }
+
+def dispatch_waves(queue, throttle):
+    # Split the queued commands into waves: urgent ones first, and at most
+    # max_in_flight commands of each throttle group per wave. Each wave
+    # waits for the largest stagger of the groups in it.
+    commands = [command for command in queue.values() if command['urgent']]
+    commands.extend([command for command in queue.values()
+                     if not command['urgent']])
+    waves = []
+    queued = {}
+    for command in commands:
+        group = throttle_group(command['service_data']['entity_id'],
+                               throttle)
+        number = 0
+        stagger = 0
+        if group is not None:
+            limits = throttle[group]
+            position = queued.get(group, 0)
+            queued[group] = position + 1
+            number = position // max(1, int(limits.get('max_in_flight', 1)))
+            stagger = float(limits.get('stagger', 0))
+        while len(waves) <= number:
+            waves.append({'stagger': 0, 'commands': []})
+        waves[number]['stagger'] = max(waves[number]['stagger'], stagger)
+        waves[number]['commands'].append(command)
+    return waves
+
+def group_commands(commands, throttle):
+    # Fold commands with the same service and payload, within the same
+    # throttle group, into one call with a list of entity ids, in the order
+    # their first command was queued:
+    # [{'service', 'service_data', 'units', 'urgent', 'commands'}, ...]
+    calls = []
+    by_payload = {}
+    for command in commands:
+        unit = command['service_data']['entity_id']
+        payload = sorted([[name, value]
+                          for name, value in command['service_data'].items()
+                          if name != 'entity_id'])
+        group_key = repr([throttle_group(unit, throttle), command['service'],
+                          payload])
+        if group_key in by_payload:
+            by_payload[group_key]['units'].append(unit)
+            by_payload[group_key]['commands'].append(command)
+            count('calls_merged')
+            continue
+        call = {
+            'service': command['service'],
+            'service_data': command['service_data'],
+            'units': [unit],
+            'urgent': command['urgent'],
+            'commands': [command]
         }
-    ]
-}
-
-def is_time_between(begin_time, end_time, check_time):
-    if begin_time < end_time:
-        return begin_time <= check_time <= end_time
-    # crosses midnight
-    return check_time >= begin_time or check_time <= end_time
-
-def time_offset(orig_time, offset):
-    hour = orig_time.hour
-    minute = orig_time.minute
-    minute = minute + offset
-    if minute < 0:
-        hour = hour - 1
-        minute = minute + 60
-    if minute > 60:
-        hour = hour + 1
-        minute = minute - 60
-    if hour < 0:
-        hour = hour + 24
-    if hour > 24:
-        hour = hour - 24
-    return datetime.time(hour=hour, minute=minute)
-
-def day_of_start(start_time, end_time, check_time):
-    today = datetime.datetime.now().weekday()
-    # today if doesn't cross midnight or no actual times given
-    if (not start_time) or (not end_time) or start_time <= end_time:
-        return today
-    # today if we're between start and midnight
-    if start_time <= check_time:
-        return today
-    # Otherwise, yesterday
-    return 6 if today == 0 else today - 1
-
-saved_state = hass.states.get(data.get('state_entity')).state
-climate_unit = data.get('climate_unit', 'climate.master_br')
-current_mode = hass.states.get(data.get('global_mode')).state
+        by_payload[group_key] = call
+        calls.append(call)
+    return calls
+
+def call_data(call, units):
+    # The call's service data for units; a single unit keeps a plain
+    # entity_id
+    service_data = {name: value
+                    for name, value in call['service_data'].items()}
+    service_data['entity_id'] = units
+    if len(units) == 1:
+        service_data['entity_id'] = units[0]
+    return service_data
+
+def superseded(command):
+    # Whether another run has decided for the unit since this one read its
+    # state_entity. Runs only write it once their call has gone out, and
+    # another can only do so while this one sleeps if runs overlap.
+    save = command['save']
+    if not save:
+        return False
+    seen = None
+    if save['state']:
+        seen = save['state'].attributes.get('decided')
+    current = hass.states.get(save['state_entity'])
+    return bool(current) and current.attributes.get('decided') != seen
+
+def save_decision(save):
+    if save:
+        save_state(save['state_entity'], save['state'], save['value'],
+                   save['changes'])
+
+def dispatch_commands(queue, throttle):
+    for number, wave in enumerate(dispatch_waves(queue, throttle)):
+        if number:
+            time.sleep(wave['stagger'])
+            count('wait_ms', wave['stagger'] * 1000)
+        commands = []
+        for command in wave['commands']:
+            if number and superseded(command):
+                count('calls_superseded')
+                continue
+            commands.append(command)
+        for call in group_commands(commands, throttle):
+            hass.services.call('climate', call['service'],
+                               call_data(call, call['units']), False)
+            count('calls_issued')
+            for command in call['commands']:
+                save_decision(command['save'])
+
+def apply_decision(decision, state_entity, state, snapshot, changes, queue,
+                   saves):
+    # Queue the unit's service call, if it needs one. Its state_entity is
+    # only written once the call has gone out, or, for a unit needing no
+    # call, after the run's calls (saves), so a run that fails before
+    # sending leaves it as it was.
+    climate_unit = decision['climate_unit']
+    desired_operation = decision['operation']
+    setpoint = decision['setpoint']
+    save = None
+    if decision['next_state']:
+        save = {'state_entity': state_entity, 'state': state,
+                'value': decision['next_state'], 'changes': changes}
+    elif 'pending' in changes and state:
+        # Nothing scheduled (Manual), but the debounce bookkeeping still ends
+        save = {'state_entity': state_entity, 'state': state,
+                'value': state.state, 'changes': changes}
+    if desired_operation:
+        mode_differs, temperature_differs = reconcile(
+            desired_operation, setpoint,
+            snapshot_state(snapshot, climate_unit))
+        message = "Setting {} to mode {} target {} from schedule {}"
+        if not (mode_differs or temperature_differs):
+            message = "{} already at mode {} target {} from schedule {}"
+        logger.info(message.format(
+            climate_unit, desired_operation, setpoint, decision['title']))
+        if not (mode_differs or temperature_differs):
+            count('calls_skipped')
+        if temperature_differs:
+            # set_temperature applies hvac_mode before the target, so one
+            # call replaces set_hvac_mode followed by a blocking wait
+            service_data = {
+                "entity_id": climate_unit,
+                "temperature": setpoint
+            }
+            if mode_differs:
+                service_data["hvac_mode"] = desired_operation
+            queue_command(queue, decision, 'set_temperature', service_data,
+                          save)
+            return
+        if mode_differs:
+            service_data = {
+                "entity_id": climate_unit,
+                "hvac_mode": desired_operation
+            }
+            queue_command(queue, decision, 'set_hvac_mode', service_data,
+                          save)
+            return
+    if save:
+        saves.append(save)
+
+run_started = time.time()
+cache_entity = data.get('cache_entity')
+compiled = False
+if cache_entity:
+    # The inline SEASONS only change with this script, and are compared by
+    # hash
+    seasons_source = data.get('seasons') or hash(repr(SEASONS))
+    compiled = load_compiled(cache_entity, seasons_source)
+else:
+    # Nothing is kept for the next run, so nothing is built beyond what
+    # this one looks up
+    INDEXED = False
+if not compiled:
+    if data.get('seasons'):
+        SEASONS_INPUT = data['seasons']
+    if cache_entity:
+        save_compiled(cache_entity, seasons_source)
+
+current_time = dt_util.now()
+now_seconds = current_time.timestamp()
+now = current_time.replace(second=0, microsecond=0)
+now_epoch_minute = int(now.timestamp()) // 60
+if cache_entity:
+    load_calendars(cache_entity, now.date())
+calendars_before = METRICS['calendars_built']
+if data.get('overrides'):
+    load_overrides(data['overrides'], now.tzinfo)
+
+climate_units = data.get('climate_units')
+if not climate_units:
+    climate_units = [data.get('climate_unit', 'climate.master_br')]
+elif climate_units == 'all':
+    climate_units = all_units()
+# Before changed_entity narrows them down: units sharing one state_entity
+# would take each other's saved state for their own on later runs
+several_units = len(climate_units) > 1 or bool(
+    data.get('changed_entity') and not data.get('climate_units') and
+    not data.get('climate_unit'))
+if not data.get('seasons') and not SEASONS:
+    # Rather than turn every unit off for want of a schedule
+    logger.warning("No schedules: pass 'seasons: !include seasons.yaml' to "
+                   "python_script.seasons; leaving the climate units alone")
+    climate_units = []
+snapshot = new_snapshot(hass.states)
+current_mode = snapshot_state(snapshot, data.get('global_mode')).state
 from_timer = data.get('from_timer', False)
 at_home_sensor = data.get('at_home_sensor')
 is_home = False
-is_away = False
 if at_home_sensor:
-    is_home = hass.states.get(at_home_sensor).state == 'on'
-    is_away = not is_home
-
-now = datetime.datetime.now().time()
-
-key = (current_mode, climate_unit)
-schedules = SEASONS.get(key)
-
-matched = False
-setpoint = None
-turn_on = False
-turn_off = False
-desired_operation = None
-title = None
-next_state = None
-if not schedules:
-    logger.info("No schedules for {}".format(key))
-else:
-    for schedule in schedules:
-        time_on_str = schedule.get('time_on')
-        time_off_str = schedule.get('time_off')
-        time_on = None
-        time_off = None
-        if time_on_str:
-            time_on = datetime.datetime.strptime(time_on_str, '%H:%M').time()
-        if time_off_str:
-            time_off = datetime.datetime.strptime(time_off_str, '%H:%M').time()
-
-        start_day = day_of_start(time_on, time_off, now)
-        day_match = True
-        days = schedule.get('days')
-        if days and len(days) == 7:
-            day_match = days[start_day] != '-' and days[start_day] != '.'
-
-        in_interval = day_match and (((not time_on) or (not time_off) or
-                                      is_time_between(time_on, time_off, now)))
-
-        home_away_match = True
-        if schedule.get('if_home'):
-            home_away_match = is_home
-        if schedule.get('if_away'):
-            home_away_match = not is_home
-
-        dry_exclude = False
-        hs = schedule.get('humidity_sensor')
-        if hs and schedule.get('if_humid'):
-            dry_exclude = float(hass.states.get(hs).state) < float(schedule['if_humid'])
-
-        if in_interval and home_away_match and not dry_exclude:
-            # When we get here, we have schedules for this unit and
-            # global mode and we're in this schedule's interval.
-            # We will obey this schedule and ignore subsequent matches
-            if not time_on:
-                time_on = datetime.datetime.strptime('00:00', '%H:%M').time()
-            window_open = False
-            if schedule.get('window'):
-                window_open = hass.states.get(schedule['window']).state == 'on'
-            else:
-                window_open = False
-
-            decided = False
-            matched = True
-            next_state = "%s-%s" % (str(schedule.get('operation')),
-                                    str(schedule.get('setpoint')))
-            same_next_state = (next_state == saved_state)
-            if window_open:
-                # Off if window is open
-                turn_off = True
-                title = schedule.get('title') + ' (Window open)'
-                decided = True
-            if (not decided) and from_timer and (not same_next_state):
-                desired_operation = schedule.get('operation')
-                if desired_operation == 'off':
-                    turn_off = True
-                else:
-                    turn_on = True
-                setpoint = schedule.get('setpoint')
-                title = schedule.get('title')
-                decided = True
-            if not decided and (not from_timer):
-                desired_operation = schedule.get('operation')
-                if desired_operation == 'off':
-                    turn_off = True
-                else:
-                    turn_on = True
-                setpoint = schedule.get('setpoint')
-                title = schedule.get('title')
-                decided = True
-            break
+    is_home = snapshot_state(snapshot, at_home_sensor).state == 'on'
 
-if not matched and current_mode != "Manual":
-    # If no schedules matched, turn off except in Manual
-    next_state = "off-None"
-    same_next_state = (next_state == saved_state)
-    if (not from_timer) or (not same_next_state):
-        turn_off = True
-        title = 'Default (Off)'
-
-if turn_off:
-    desired_operation = 'off'
-
-if desired_operation:
-    logger.info("Setting {} to mode {} target {} from schedule {}".format(
-        climate_unit, desired_operation, setpoint, title))
-    service_data = {
-        "entity_id": climate_unit,
-        "hvac_mode": desired_operation
-    }
-    hass.services.call('climate', 'set_hvac_mode', service_data, False)
+changed_entity = data.get('changed_entity')
+if changed_entity:
+    affected = dependent_units(dependency_index(at_home_sensor),
+                               changed_entity, current_mode)
+    if data.get('climate_units') or data.get('climate_unit'):
+        climate_units = [unit for unit in climate_units if unit in affected]
+    else:
+        climate_units = affected
+    if not climate_units:
+        logger.info("No climate units depend on {}".format(changed_entity))
+if several_units and '{}' not in data.get('state_entity'):
+    logger.error("state_entity {} needs '{{}}' to tell several climate "
+                 "units apart; leaving them alone".format(
+                     data.get('state_entity')))
+    climate_units = []
+
+next_transition_entity = data.get('next_transition_entity')
+debounce = data.get('debounce')
+throttle = data.get('throttle') or {}
+commands = {}
+saves = []
+metrics_entity = data.get('metrics_entity')
+matched_titles = {}
 
-    if setpoint:
-        time.sleep(2.0)
-        if '.' in str(setpoint):
-            setpoint_num = float(setpoint)
+earliest_transition = None
+for climate_unit in climate_units:
+    unit_started = time.time()
+    unit_metrics = {name: value for name, value in METRICS.items()}
+    unit_reads = snapshot['reads']
+    state_entity = unit_state_entity(data.get('state_entity'), climate_unit)
+    key = (current_mode, climate_unit)
+    unit_from_timer = from_timer
+    next_transition = None
+    # One unit's unreadable input (say a humidity sensor reporting
+    # 'unavailable') leaves that unit alone, not the whole run
+    try:
+        state = snapshot_state(snapshot, state_entity)
+        deferred_until = None
+        if debounce:
+            deferred_until = debounce_until(state, debounce, from_timer,
+                                            now_seconds)
+            if state.attributes.get('pending'):
+                # Whatever triggers it, a pending unit owes an event
+                # evaluation
+                unit_from_timer = False
+        if deferred_until is not None:
+            count('units_deferred')
+            matched_titles[climate_unit] = None
+            next_transition = datetime.datetime.fromtimestamp(
+                deferred_until, now.tzinfo)
+            if not state.attributes.get('pending'):
+                save_state(state_entity, state, state.state,
+                           {'pending': True})
+        elif unit_from_timer and unchanged_since_last_run(
+                state, key, is_home, now_epoch_minute, snapshot):
+            count('units_short_circuited')
+            matched_titles[climate_unit] = None
+            until = state.attributes['fingerprint']['until']
+            if until is not None:
+                next_transition = datetime.datetime.fromtimestamp(
+                    until * 60, now.tzinfo)
         else:
-            setpoint_num = int(setpoint)
-        service_data = {
-            "entity_id": climate_unit,
-            "temperature": setpoint_num,
-            "hvac_mode": desired_operation
-        }
-        hass.services.call('climate', 'set_temperature', service_data, False)
+            count('units_evaluated')
+            humid_latch = state.attributes.get('humid_latch')
+            if humid_latch and humid_latch[0] == current_mode:
+                humid_latch = humid_latch[1]
+            else:
+                humid_latch = None
+            decision = evaluate_unit(climate_unit, current_mode, is_home,
+                                     state.state, unit_from_timer, now,
+                                     snapshot, humid_latch)
+            matched_titles[climate_unit] = decision['title']
+            if decision['next_boundary'] is not None:
+                next_transition = datetime.datetime.fromtimestamp(
+                    (now_epoch_minute + decision['next_boundary']) * 60,
+                    now.tzinfo)
+            changes = {
+                'next_transition': None,
+                'fingerprint': fingerprint(decision, key, is_home,
+                                           now_epoch_minute, snapshot),
+                'humid_latch': None
+            }
+            if decision['humid_latch'] is not None:
+                changes['humid_latch'] = [current_mode,
+                                          decision['humid_latch']]
+            if next_transition:
+                changes['next_transition'] = next_transition.isoformat()
+            if debounce and not unit_from_timer:
+                # Whole seconds, so the end of the window is a time a
+                # trigger can fire at
+                changes['last_evaluated'] = int(now_seconds)
+                changes['pending'] = False
+            if throttle:
+                changes['decided'] = run_started
+            apply_decision(decision, state_entity, state, snapshot,
+                           changes, commands, saves)
+    except Exception as error:
+        logger.error("Leaving {} alone: {}".format(climate_unit, error))
+        matched_titles[climate_unit] = None
+        next_transition = None
+    if next_transition_entity and next_transition:
+        if '{}' in next_transition_entity:
+            set_next_transition(
+                unit_state_entity(next_transition_entity, climate_unit),
+                next_transition)
+        elif (not earliest_transition or
+              next_transition < earliest_transition):
+            earliest_transition = next_transition
+    if metrics_entity and '{}' in metrics_entity:
+        publish_metrics(unit_state_entity(metrics_entity, climate_unit),
+                        metrics_since(unit_metrics, snapshot, unit_reads),
+                        time.time() - unit_started,
+                        {climate_unit: matched_titles[climate_unit]})
+
+dispatch_commands(commands, throttle)
+for save in saves:
+    save_decision(save)
+
+if cache_entity and METRICS['calendars_built'] > calendars_before:
+    save_calendars(cache_entity, now.date())
 
-if next_state:
-    hass.states.set(data.get('state_entity'), next_state)
+if (next_transition_entity and '{}' not in next_transition_entity and
+        climate_units):
+    earliest_transition = earliest_of_all(earliest_transition, climate_units,
+                                          snapshot, now)
+if earliest_transition:
+    set_next_transition(next_transition_entity, earliest_transition)
 
+if metrics_entity and '{}' not in metrics_entity:
+    METRICS['entity_reads'] = snapshot['reads']
+    publish_metrics(metrics_entity, METRICS, time.time() - run_started,
+                    matched_titles)
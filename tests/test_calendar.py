@@ -0,0 +1,86 @@
+"""local_instant() and build_calendar() in seasons.py across clock changes."""
+import datetime
+import zoneinfo
+
+from tools.engine import Engine
+
+NEW_YORK = zoneinfo.ZoneInfo('America/New_York')
+# Clocks go forward at 02:00 on the first date and back at 02:00 on the second
+SPRING = datetime.date(2026, 3, 8)
+FALL = datetime.date(2026, 11, 1)
+
+
+def _epoch_minute(*args):
+    when = datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+    return int(when.timestamp()) // 60
+
+
+def _engine(times):
+    # One schedule for each (time_on, time_off) every day
+    engine = Engine()
+    engine.use_schedules({('Mode', 'climate.unit'): [
+        {'title': str(number), 'time_on': time_on, 'time_off': time_off,
+         'operation': 'heat'}
+        for number, (time_on, time_off) in enumerate(times)]})
+    return engine
+
+
+def test_skipped_time_maps_to_the_jump():
+    engine = Engine()
+    # 02:30 does not exist; the clocks read 03:00 EDT at 07:00 UTC
+    assert (engine.local_instant(SPRING, 150, NEW_YORK) ==
+            engine.local_instant(SPRING, 180, NEW_YORK) ==
+            _epoch_minute(2026, 3, 8, 7, 0))
+
+
+def test_repeated_time_maps_to_its_first_occurrence():
+    engine = Engine()
+    # 01:30 comes round at 05:30 UTC (EDT) and again at 06:30 UTC (EST)
+    assert (engine.local_instant(FALL, 90, NEW_YORK) ==
+            _epoch_minute(2026, 11, 1, 5, 30))
+    assert (engine.local_instant(FALL, 180, NEW_YORK) ==
+            _epoch_minute(2026, 11, 1, 8, 0))
+
+
+def test_calendar_instants_are_increasing():
+    engine = _engine([('01:30', '02:15'), ('02:30', '03:30'),
+                      ('02:45', '05:00')])
+    key = ('Mode', 'climate.unit')
+    for day in [SPRING, FALL]:
+        calendar = engine.build_calendar(engine.schedule_index(key), day,
+                                         NEW_YORK)
+        instants = calendar['instants']
+        assert instants == sorted(set(instants))
+        assert len(instants) == len(calendar['segments'])
+
+
+def test_boundaries_count_real_minutes():
+    engine = _engine([('00:59', '03:59')])
+    key = ('Mode', 'climate.unit')
+    # 00:59 to 03:59 by the clock is four hours on the fall date
+    before = datetime.datetime(2026, 11, 1, 0, 59, tzinfo=NEW_YORK)
+    segment, until = engine.schedule_position(key, before)
+    assert until == 4 * 60
+    # and two on the spring date
+    before = datetime.datetime(2026, 3, 8, 0, 59, tzinfo=NEW_YORK)
+    segment, until = engine.schedule_position(key, before)
+    assert until == 2 * 60
+
+
+def test_lookup_without_index_agrees_with_the_calendar():
+    engine = _engine([('01:30', '02:15'), ('02:30', '03:30'),
+                      ('02:45', '05:00'), ('23:00', '01:45')])
+    key = ('Mode', 'climate.unit')
+    for day in [SPRING, FALL]:
+        midnight = datetime.datetime(day.year, day.month, day.day,
+                                     tzinfo=datetime.timezone.utc)
+        for minutes in range(0, 2 * 24 * 60, 5):
+            now = (midnight + datetime.timedelta(minutes=minutes)).astimezone(
+                NEW_YORK)
+            engine.namespace['INDEXED'] = True
+            indexed = engine.schedule_candidates(key, now)
+            engine.namespace['INDEXED'] = False
+            assert engine.schedule_candidates(key, now) == indexed
+            # Straight off the records except in the repeated hour
+            if not now.fold:
+                assert engine.scan_schedules(key, now) == indexed
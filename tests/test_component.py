@@ -0,0 +1,227 @@
+"""The integration's controller, against a stand-in for hass.
+
+Only the controller's own wiring is exercised: which units an input change
+marks pending, and the timer it keeps armed for the next schedule boundary.
+Listeners and timers are recorded instead of registered.
+"""
+import asyncio
+import datetime
+import logging
+import types
+import zoneinfo
+
+import pytest
+
+pytest.importorskip('homeassistant')
+
+from custom_components import seasons as component  # noqa: E402
+from custom_components.seasons.engine import Engine  # noqa: E402
+
+NEW_YORK = zoneinfo.ZoneInfo('America/New_York')
+# A Wednesday, before the loft's day schedule starts
+MORNING = datetime.datetime(2026, 10, 14, 6, 30, tzinfo=NEW_YORK)
+SEASONS = {
+    'Winter': {
+        'climate.loft': [{'title': 'Day', 'time_on': '07:00',
+                          'time_off': '22:00', 'operation': 'heat',
+                          'setpoint': 68,
+                          'window': 'binary_sensor.loft_window'}],
+        'climate.den': [{'title': 'Morning', 'time_on': '06:00',
+                         'time_off': '08:00', 'operation': 'heat',
+                         'setpoint': 70}],
+    },
+    'Summer': {
+        'climate.den': [{'title': 'Day', 'operation': 'cool',
+                         'setpoint': 76,
+                         'window': 'binary_sensor.loft_window'}],
+    },
+}
+
+
+class _State:
+    def __init__(self, state, attributes=None):
+        self.state = state
+        self.attributes = attributes or {}
+
+
+class _States:
+    def __init__(self, states):
+        self.states = {entity_id: _State(state)
+                       for entity_id, state in states.items()}
+
+    def get(self, entity_id):
+        return self.states.get(entity_id)
+
+    def async_set(self, entity_id, state, attributes=None,
+                  force_update=False):
+        self.states[entity_id] = _State(state, attributes)
+
+
+class _Services:
+    def __init__(self):
+        self.calls = []
+
+    async def async_call(self, domain, service, service_data,
+                         blocking=False):
+        self.calls.append((domain, service, service_data))
+
+
+class _Hass:
+    def __init__(self, loop, states):
+        self.loop = loop
+        self.states = _States(states)
+        self.services = _Services()
+        self.data = {}
+        self.tasks = []
+
+    async def async_add_executor_job(self, target, *args):
+        return target(*args)
+
+    def async_create_task(self, coroutine):
+        # The debouncer's call is only recorded, not run
+        self.tasks.append(coroutine)
+        coroutine.close()
+
+
+class _Tracker:
+    """Stands in for async_track_point_in_time and
+    async_track_state_change_event."""
+
+    def __init__(self):
+        self.timers = []
+        self.listeners = []
+
+    def track_point_in_time(self, hass, action, when):
+        timer = {'action': action, 'when': when, 'cancelled': False}
+        self.timers.append(timer)
+        return lambda: timer.update(cancelled=True)
+
+    def track_state_change_event(self, hass, entity_ids, action):
+        self.listeners.append((entity_ids, action))
+        return lambda: None
+
+    def armed(self, action):
+        # [time, whether cancelled since] of each timer set for action
+        return [[timer['when'], timer['cancelled']] for timer in self.timers
+                if timer['action'] == action]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [MORNING]
+    monkeypatch.setattr(component.dt_util, 'now', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = _Tracker()
+    monkeypatch.setattr(component, 'async_track_point_in_time',
+                        tracker.track_point_in_time)
+    monkeypatch.setattr(component, 'async_track_state_change_event',
+                        tracker.track_state_change_event)
+    return tracker
+
+
+async def _started(mode):
+    # A controller for every unit in SEASONS, after its first evaluation
+    hass = _Hass(asyncio.get_running_loop(), {
+        'input_select.climate_mode': mode,
+        'binary_sensor.loft_window': 'off',
+        'climate.loft': 'off',
+        'climate.den': 'off',
+    })
+    conf = component.CONFIG_SCHEMA({component.DOMAIN: {
+        'global_mode': 'input_select.climate_mode',
+        'state_entity': 'input_text.seasons_{}',
+        'seasons': SEASONS,
+    }})[component.DOMAIN]
+    engine = Engine(hass, {'global_mode': conf['global_mode']},
+                    logging.getLogger(__name__))
+    engine.use_schedules(SEASONS)
+    engine.load_overrides([], NEW_YORK)
+    controller = component.SeasonsController(hass, engine, conf)
+    await controller.async_start(hass)
+    # Let the mode table refresh scheduled after the calls run
+    await asyncio.sleep(0)
+    return controller
+
+
+def _change(controller, entity_id):
+    controller._async_input_changed(
+        types.SimpleNamespace(data={'entity_id': entity_id}))
+
+
+def test_input_change_marks_its_dependent_units(clock, tracker):
+    async def run():
+        controller = await _started('Winter')
+        built = []
+        index = controller.engine.namespace['dependency_index']
+        controller.engine.namespace['dependency_index'] = (
+            lambda *args: built.append(args) or index(*args))
+        entity_ids, action = tracker.listeners[0]
+        assert entity_ids == ['binary_sensor.loft_window',
+                              'input_select.climate_mode']
+        # In Winter only the loft reads the window
+        _change(controller, 'binary_sensor.loft_window')
+        assert controller.pending == {'climate.loft'}
+        assert len(controller.hass.tasks) == 1
+        # In Summer only the den does
+        controller.pending.clear()
+        controller.hass.states.async_set('input_select.climate_mode',
+                                         'Summer')
+        _change(controller, 'binary_sensor.loft_window')
+        assert controller.pending == {'climate.den'}
+        # A mode change concerns every unit
+        _change(controller, 'input_select.climate_mode')
+        assert controller.pending == {'climate.den', 'climate.loft'}
+        # The index built at start served every event
+        assert built == []
+
+    asyncio.run(run())
+
+
+def test_boundary_timer_is_armed_and_rearmed(clock, tracker):
+    async def run():
+        controller = await _started('Winter')
+        boundary = controller._async_boundary
+        # The loft's day schedule starts at 07:00, before the den's
+        # morning ends at 08:00
+        seven = MORNING.replace(hour=7, minute=0)
+        assert tracker.armed(boundary) == [[seven, False]]
+        assert controller.hass.services.calls == [
+            ('climate', 'set_temperature',
+             {'entity_id': 'climate.den', 'temperature': 70,
+              'hvac_mode': 'heat'})]
+        controller.hass.services.calls.clear()
+        # Firing at 07:00 evaluates the units and arms the next boundary
+        clock[0] = seven
+        await boundary(seven)
+        await asyncio.sleep(0)
+        assert controller.hass.services.calls == [
+            ('climate', 'set_temperature',
+             {'entity_id': 'climate.loft', 'temperature': 68,
+              'hvac_mode': 'heat'})]
+        eight = MORNING.replace(hour=8, minute=0)
+        assert tracker.armed(boundary) == [[seven, False], [eight, False]]
+        # An event run in between replaces the armed timer
+        controller.hass.states.async_set('binary_sensor.loft_window', 'on')
+        await controller.async_evaluate(['climate.loft'], from_timer=False)
+        assert tracker.armed(boundary) == [[seven, False], [eight, True],
+                                           [eight, False]]
+
+    asyncio.run(run())
+
+
+def test_shared_state_entity_is_refused(clock, tracker):
+    async def run():
+        hass = _Hass(asyncio.get_running_loop(), {})
+        config = component.CONFIG_SCHEMA({component.DOMAIN: {
+            'global_mode': 'input_select.climate_mode',
+            'state_entity': 'input_text.seasons',
+            'seasons': SEASONS,
+        }})
+        assert not await component.async_setup(hass, config)
+        assert component.DOMAIN not in hass.data
+
+    asyncio.run(run())
@@ -0,0 +1,21 @@
+"""The copy of seasons.py the integration ships, and the shared loader."""
+import filecmp
+import os
+
+from tools import engine
+
+COMPONENT = os.path.join(engine.ROOT, 'custom_components', 'seasons')
+
+
+def test_component_script_is_seasons_py():
+    # The integration runs its own copy; any change to seasons.py goes to both
+    assert filecmp.cmp(engine.SCRIPT, os.path.join(COMPONENT, 'seasons.py'),
+                       shallow=False)
+
+
+def test_engine_keeps_only_definitions():
+    # The run at the bottom of the script is left out: loading it reads no
+    # state and sets none
+    loaded = engine.Engine()
+    assert callable(loaded.evaluate_unit)
+    assert 'climate_units' not in loaded.namespace
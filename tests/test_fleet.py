@@ -0,0 +1,36 @@
+"""tools/fleet.py, run at a time given in another timezone than the host's."""
+import datetime
+import os
+import time
+import zoneinfo
+
+import pytest
+
+pytest.importorskip('yaml')
+
+from tools.engine import Engine  # noqa: E402
+from tools.fleet import evaluate_fleet  # noqa: E402
+
+SCHEDULES = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'seasons.yaml')
+
+
+@pytest.fixture
+def utc_host(monkeypatch):
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_aware_time_keeps_its_timezone(utc_host):
+    engine = Engine()
+    engine.load_schedules(SCHEDULES)
+    snapshots = {'climate.loft': {'mode': 'Hot Summer', 'home': True,
+                                  'states': {'binary_sensor.skylight': 'off'}}}
+    # 21:59 in New York is 01:59 the next morning on the host
+    when = datetime.datetime(2026, 10, 14, 21, 59,
+                             tzinfo=zoneinfo.ZoneInfo('America/New_York'))
+    decision = evaluate_fleet(engine, snapshots, when, workers=1)
+    assert decision['climate.loft']['title'] == 'Evening'
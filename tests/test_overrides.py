@@ -0,0 +1,81 @@
+"""Dated overrides in seasons.py: their bounds, filters and boundaries."""
+import datetime
+import zoneinfo
+
+from tools.engine import Engine
+
+NEW_YORK = zoneinfo.ZoneInfo('America/New_York')
+SCHEDULES = {('Winter', 'climate.loft'): [
+    {'title': 'Day', 'time_on': '07:00', 'time_off': '22:00',
+     'operation': 'heat', 'setpoint': 68}]}
+
+
+class _Store:
+    def get(self, entity_id):
+        return None
+
+
+def _engine(**override):
+    engine = Engine()
+    engine.use_schedules(SCHEDULES)
+    fields = {'title': 'Vacation', 'operation': 'heat', 'setpoint': 58}
+    fields.update(override)
+    engine.load_overrides([fields], NEW_YORK)
+    return engine
+
+
+def _decide(engine, when, mode='Winter', climate_unit='climate.loft'):
+    return engine.evaluate_unit(climate_unit, mode, True, None, False,
+                                when.replace(tzinfo=NEW_YORK),
+                                engine.new_snapshot(_Store()))
+
+
+def test_date_end_is_included():
+    engine = _engine(start='2026-12-20', end='2026-12-31')
+    assert _decide(engine, datetime.datetime(2026, 12, 31, 23, 59))[
+        'title'] == 'Vacation'
+    assert _decide(engine, datetime.datetime(2027, 1, 1, 9, 0))[
+        'title'] == 'Day'
+
+
+def test_time_end_is_excluded():
+    engine = _engine(start='2026-12-20 08:00', end='2026-12-31 18:30')
+    assert _decide(engine, datetime.datetime(2026, 12, 20, 8, 0))[
+        'title'] == 'Vacation'
+    assert _decide(engine, datetime.datetime(2026, 12, 31, 18, 29))[
+        'title'] == 'Vacation'
+    assert _decide(engine, datetime.datetime(2026, 12, 31, 18, 30))[
+        'title'] == 'Day'
+
+
+def test_modes_filter():
+    # A single mode, not a list, must not match modes it is a part of
+    engine = _engine(start='2026-12-20', end='2026-12-31',
+                     modes='Cold Winter')
+    during = datetime.datetime(2026, 12, 24, 12, 0)
+    assert _decide(engine, during)['title'] == 'Day'
+    assert _decide(engine, during, mode='Cold Winter')['title'] == 'Vacation'
+    engine = _engine(start='2026-12-20', end='2026-12-31',
+                     modes=['Winter'])
+    assert _decide(engine, during)['title'] == 'Vacation'
+
+
+def test_units_filter():
+    during = datetime.datetime(2026, 12, 24, 12, 0)
+    for units in ['climate.master_br', ['climate.master_br']]:
+        engine = _engine(start='2026-12-20', end='2026-12-31', units=units)
+        assert _decide(engine, during)['title'] == 'Day'
+        assert _decide(engine, during, climate_unit='climate.master_br')[
+            'title'] == 'Vacation'
+
+
+def test_override_bounds_are_boundaries():
+    engine = _engine(start='2026-12-20 12:00', end='2026-12-20 18:30')
+    # Starting before the schedule's next change at 22:00
+    decision = _decide(engine, datetime.datetime(2026, 12, 20, 11, 0))
+    assert decision['title'] == 'Day'
+    assert decision['next_boundary'] == 60
+    # and ending before it
+    decision = _decide(engine, datetime.datetime(2026, 12, 20, 13, 0))
+    assert decision['title'] == 'Vacation'
+    assert decision['next_boundary'] == 5 * 60 + 30
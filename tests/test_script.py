@@ -0,0 +1,168 @@
+"""seasons.py run in the python_script sandbox, against tools/bench.py's
+stand-ins."""
+import datetime
+import os
+import zoneinfo
+
+import pytest
+
+yaml = pytest.importorskip('yaml')
+pytest.importorskip('RestrictedPython')
+
+from tools.bench import (  # noqa: E402
+    FakeHass, FakeTime, SEASONS_SCRIPT, run_script)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NEW_YORK = zoneinfo.ZoneInfo('America/New_York')
+UNITS = ['climate.first_floor', 'climate.first_floor_heat', 'climate.loft',
+         'climate.loft_heat', 'climate.master_br', 'climate.second_floor']
+# Hot Summer: master_br's Dehumidify schedule reads sensor.dewpoint_mbr, and
+# first_floor and loft need a call
+DEHUMIDIFYING = datetime.datetime(2026, 10, 14, 20, 1, tzinfo=NEW_YORK)
+
+
+@pytest.fixture(scope='module')
+def seasons():
+    with open(os.path.join(ROOT, 'seasons.yaml')) as source:
+        return yaml.safe_load(source)
+
+
+def _house(mode, **states):
+    initial = {'input_select.climate_mode': mode,
+               'binary_sensor.anyone_home': 'on',
+               'sensor.dewpoint_mbr': '62',
+               'binary_sensor.bedroom_window': 'off',
+               'binary_sensor.skylight': 'off',
+               'binary_sensor.first_floor_windows': 'off'}
+    for unit in UNITS:
+        initial[unit] = 'off'
+        initial[_state_entity(unit)] = ''
+    initial.update(states)
+    return FakeHass(initial)
+
+
+def _state_entity(unit):
+    return 'input_text.seasons_' + unit.split('.', 1)[1]
+
+
+def _data(seasons, **data):
+    return dict({'seasons': seasons, 'climate_units': 'all',
+                 'global_mode': 'input_select.climate_mode',
+                 'at_home_sensor': 'binary_sensor.anyone_home',
+                 'state_entity': 'input_text.seasons_{}'}, **data)
+
+
+def _saved(hass, unit):
+    return hass.states.states[_state_entity(unit)].state
+
+
+def _climate_calls(hass):
+    return sorted(data['entity_id'] for domain, service, data
+                  in hass.services.calls if domain == 'climate')
+
+
+def test_unreadable_sensor_leaves_only_its_unit(seasons):
+    hass = _house('Hot Summer', **{'sensor.dewpoint_mbr': 'unavailable'})
+    run_script(SEASONS_SCRIPT, hass, _data(seasons), DEHUMIDIFYING)
+    assert _climate_calls(hass) == ['climate.first_floor', 'climate.loft']
+    assert _saved(hass, 'climate.first_floor') == 'cool-75'
+    assert _saved(hass, 'climate.master_br') == ''
+
+
+def test_state_is_saved_only_once_the_call_is_sent(seasons):
+    hass = _house('Hot Summer')
+
+    def refuse(domain, service, service_data=None, blocking=False):
+        raise RuntimeError('Service not found')
+
+    hass.services.call = refuse
+    with pytest.raises(RuntimeError):
+        run_script(SEASONS_SCRIPT, hass, _data(seasons), DEHUMIDIFYING)
+    assert _saved(hass, 'climate.first_floor') == ''
+    assert _saved(hass, 'climate.loft') == ''
+    # A timer run after the failure still owes the units their calls
+    del hass.services.call
+    run_script(SEASONS_SCRIPT, hass, _data(seasons, from_timer=True),
+               DEHUMIDIFYING)
+    assert _climate_calls(hass) == ['climate.first_floor', 'climate.loft']
+
+
+def test_newer_run_supersedes_a_waiting_call(seasons):
+    hass = _house('Hot Summer')
+    throttle = {'climate.': {'max_in_flight': 1, 'stagger': 1}}
+
+    class Overlapping(FakeTime):
+        # The skylight opens while the first run waits between waves, and
+        # a second run turns the loft off
+        def sleep(self, seconds):
+            super().sleep(seconds)
+            hass.states.states['binary_sensor.skylight'].state = 'on'
+            run_script(SEASONS_SCRIPT, hass, _data(seasons, throttle=throttle),
+                       DEHUMIDIFYING)
+
+    run_script(SEASONS_SCRIPT, hass, _data(seasons, throttle=throttle),
+               DEHUMIDIFYING, Overlapping())
+    assert hass.states.states['climate.loft'].state == 'off'
+    assert _saved(hass, 'climate.loft') == 'cool-81'
+    assert ('climate', 'set_temperature',
+            {'entity_id': 'climate.loft', 'temperature': 81,
+             'hvac_mode': 'cool'}) not in hass.services.calls
+
+
+def _next_transition(hass):
+    return hass.states.states['input_datetime.seasons_next'].state
+
+
+def test_narrowed_run_keeps_the_earliest_transition(seasons):
+    hass = _house('Hot Summer')
+    data = _data(seasons, next_transition_entity='input_datetime.seasons_next')
+    evening = datetime.datetime(2026, 10, 14, 23, 30, tzinfo=NEW_YORK)
+    run_script(SEASONS_SCRIPT, hass, data, evening)
+    # The loft's Night schedule starts first
+    assert _next_transition(hass) == '2026-10-15 00:04:00'
+    # A bedroom window only concerns master_br, whose next transition is
+    # later
+    hass.states.states['binary_sensor.bedroom_window'].state = 'on'
+    run_script(SEASONS_SCRIPT, hass,
+               dict(data, changed_entity='binary_sensor.bedroom_window'),
+               evening + datetime.timedelta(minutes=10))
+    assert _next_transition(hass) == '2026-10-15 00:04:00'
+
+
+def test_single_unit_run_keeps_an_earlier_transition(seasons):
+    hass = _house('Hot Summer')
+    evening = datetime.datetime(2026, 10, 14, 23, 30, tzinfo=NEW_YORK)
+    for unit in ['climate.loft', 'climate.master_br']:
+        run_script(SEASONS_SCRIPT, hass,
+                   _data(seasons, climate_units=None, climate_unit=unit,
+                         state_entity=_state_entity(unit),
+                         next_transition_entity='input_datetime.seasons_next'),
+                   evening)
+    assert _next_transition(hass) == '2026-10-15 00:04:00'
+    # Once that time has come, a later one takes its place
+    run_script(SEASONS_SCRIPT, hass,
+               _data(seasons, climate_units=None,
+                     climate_unit='climate.master_br',
+                     state_entity=_state_entity('climate.master_br'),
+                     next_transition_entity='input_datetime.seasons_next'),
+               datetime.datetime(2026, 10, 15, 0, 4, tzinfo=NEW_YORK))
+    assert _next_transition(hass) == '2026-10-15 02:59:00'
+
+
+def test_shared_state_entity_leaves_several_units_alone(seasons, caplog):
+    hass = _house('Hot Summer', **{'input_text.seasons': ''})
+    for data in [{},
+                 {'climate_units': None,
+                  'changed_entity': 'binary_sensor.bedroom_window'}]:
+        run_script(SEASONS_SCRIPT, hass,
+                   _data(seasons, state_entity='input_text.seasons', **data),
+                   DEHUMIDIFYING)
+        assert _climate_calls(hass) == []
+        assert hass.states.states['input_text.seasons'].state == ''
+    assert "needs '{}'" in caplog.text
+    # A single unit may have it to itself
+    run_script(SEASONS_SCRIPT, hass,
+               _data(seasons, climate_units=None, climate_unit='climate.loft',
+                     state_entity='input_text.seasons'),
+               DEHUMIDIFYING)
+    assert _climate_calls(hass) == ['climate.loft']
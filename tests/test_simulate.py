@@ -0,0 +1,109 @@
+"""tools/simulate.py against evaluate_unit() in seasons.py.
+
+The simulator decides a whole week at once; seasons.py decides one minute
+at a time. Fed the same presence, window and humidity series, they must
+agree at every minute, humidity latches included.
+"""
+import datetime
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('yaml')
+
+from tools.engine import Engine  # noqa: E402
+from tools.simulate import simulate  # noqa: E402
+
+SCHEDULES = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'seasons.yaml')
+# Monday 00:00; UTC, as the simulator knows nothing of clock changes
+MONDAY = datetime.datetime(2026, 10, 12, tzinfo=datetime.timezone.utc)
+WINDOWS = ['binary_sensor.bedroom_window', 'binary_sensor.skylight',
+           'binary_sensor.first_floor_windows']
+HUMIDITY_SENSOR = 'sensor.dewpoint_mbr'
+
+
+class _State:
+    def __init__(self, state):
+        self.state = state
+        self.attributes = {}
+
+
+def _toggles(rng, size, rate):
+    # A boolean series that flips at random, about rate times a minute
+    return np.logical_xor.accumulate(rng.random(size) < rate)
+
+
+def _swing(rng, size):
+    # Humidity rising and falling through the if_humid and if_humid_release
+    # bands several times an hour, in half-point steps
+    minutes = np.arange(size)
+    noise = rng.normal(0, 0.5, size)
+    return np.round(2 * (62 + 3 * np.sin(minutes / 7) + noise)) / 2
+
+
+@pytest.fixture(scope='module')
+def week():
+    engine = Engine()
+    engine.load_schedules(SCHEDULES)
+    rng = np.random.default_rng(13)
+    size = engine.MINUTES_PER_WEEK
+    series = {
+        'home': _toggles(rng, size, 0.01),
+        'windows': {window: _toggles(rng, size, 0.005)
+                    for window in WINDOWS},
+        'humidity': {HUMIDITY_SENSOR: _swing(rng, size)},
+    }
+    keys = list(engine.SEASONS) + [('Manual', 'climate.loft'),
+                                   ('Nowhere', 'climate.loft')]
+    return engine, series, simulate(engine, keys, **series)
+
+
+def _evaluate_week(engine, series, key):
+    # evaluate_unit()'s decision at every minute, with the latch carried
+    # from run to run as the state_entity does
+    mode, climate_unit = key
+    humid_latch = None
+    decisions = []
+    for minute in range(engine.MINUTES_PER_WEEK):
+        store = {window: _State('on' if opened[minute] else 'off')
+                 for window, opened in series['windows'].items()}
+        store[HUMIDITY_SENSOR] = _State(
+            str(series['humidity'][HUMIDITY_SENSOR][minute]))
+        decision = engine.evaluate_unit(
+            climate_unit, mode, bool(series['home'][minute]), None, False,
+            MONDAY + datetime.timedelta(minutes=minute),
+            engine.new_snapshot(store), humid_latch)
+        humid_latch = decision['humid_latch']
+        decisions.append(decision)
+    return decisions
+
+
+def test_simulation_matches_evaluate_unit(week):
+    engine, series, results = week
+    mismatches = {}
+    for key, result in results.items():
+        for minute, decision in enumerate(_evaluate_week(engine, series,
+                                                         key)):
+            expected = (decision['operation'], decision['setpoint'],
+                        decision['title'])
+            simulated = (result['operation'][minute],
+                         result['setpoint'][minute], result['title'][minute])
+            if simulated != expected:
+                mismatches.setdefault(key, []).append(
+                    (minute, simulated, expected))
+    assert {key: found[:3] for key, found in mismatches.items()} == {}
+
+
+def test_series_exercise_the_latch(week):
+    # Some minutes must be held by if_humid_release alone, or the test above
+    # says nothing about hysteresis
+    engine, series, results = week
+    key = ('Hot Summer', 'climate.master_br')
+    humidity = series['humidity'][HUMIDITY_SENSOR]
+    record = engine.compiled_schedules(key)[0]
+    assert record['if_humid_release'] is not None
+    held = ((results[key]['schedule'] == 0) &
+            (humidity < record['if_humid']))
+    assert held.any()
@@ -0,0 +1 @@
+"""Offline tools for seasons.py, run outside Home Assistant."""
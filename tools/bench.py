@@ -0,0 +1,384 @@
+"""Benchmark seasons.py and bedroom_ac_schedule.py outside Home Assistant.
+
+Both scripts are executed as Home Assistant's python_script integration
+executes them: compiled with RestrictedPython on every call and run with its
+guarded builtins and attribute checks, so code the sandbox rejects fails
+here too. In-memory stand-ins replace the injected ``hass``, ``data``,
+``logger``, ``time`` and ``dt_util`` globals. The stand-ins count state reads
+and writes, record service calls and make ``time.sleep`` return immediately
+(the requested sleep is added up instead). seasons.py is run against
+synthetic schedules of growing size, both once per unit and as a single
+batch run. Each scenario is repeated and the medians of the compile and exec
+times are reported::
+
+    python -m tools.bench --schedules 1 10 100 1000 --units 1 10 100 500
+
+Needs RestrictedPython.
+"""
+import argparse
+import datetime
+import logging
+import os
+import random
+import statistics
+import time as real_time
+import types
+
+from RestrictedPython import (
+    compile_restricted_exec, safe_builtins, utility_builtins)
+from RestrictedPython.Eval import default_guarded_getitem
+from RestrictedPython.Guards import (
+    full_write_guard, guarded_iter_unpack_sequence, guarded_unpack_sequence)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEASONS_SCRIPT = os.path.join(ROOT, 'seasons.py')
+BEDROOM_SCRIPT = os.path.join(ROOT, 'bedroom_ac_schedule.py')
+
+MODE = 'Bench'
+WINDOWS = ['binary_sensor.window_%d' % n for n in range(4)]
+HUMIDITY_SENSOR = 'sensor.dewpoint_bench'
+AT_HOME_SENSOR = 'binary_sensor.anyone_home'
+
+
+class FakeState:
+    def __init__(self, state, attributes=None):
+        self.state = state
+        self.attributes = dict(attributes or {})
+
+
+class FakeStates:
+    """hass.states: a dict of FakeState that counts reads and writes."""
+
+    def __init__(self, states=None):
+        self.states = {entity_id: FakeState(state)
+                       for entity_id, state in (states or {}).items()}
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, entity_id):
+        self.reads += 1
+        return self.states.get(entity_id)
+
+    def set(self, entity_id, state, attributes=None, force_update=False):
+        self.writes += 1
+        self.states[entity_id] = FakeState(state, attributes)
+
+
+class FakeServices:
+    """hass.services: records calls and applies climate ones to the states,
+    as the thermostat would, and input_datetime ones, as the helper would."""
+
+    def __init__(self, states):
+        self.states = states
+        self.calls = []
+
+    def call(self, domain, service, service_data=None, blocking=False):
+        service_data = dict(service_data or {})
+        self.calls.append((domain, service, service_data))
+        if domain == 'input_datetime':
+            self.states.states[service_data['entity_id']] = FakeState(
+                service_data['datetime'])
+        if domain != 'climate':
+            return
+        entity_ids = service_data['entity_id']
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        for entity_id in entity_ids:
+            state = self.states.states.setdefault(entity_id,
+                                                  FakeState('off'))
+            mode = (service_data.get('hvac_mode') or
+                    service_data.get('operation_mode'))
+            if mode:
+                state.state = mode
+            if 'temperature' in service_data:
+                state.attributes['temperature'] = service_data['temperature']
+
+
+class FakeHass:
+    def __init__(self, states=None):
+        self.states = FakeStates(states)
+        self.services = FakeServices(self.states)
+
+
+class FakeTime:
+    """The time module, with sleep() recorded instead of waited for."""
+
+    def __init__(self):
+        self.slept = 0.0
+
+    def sleep(self, seconds):
+        self.slept += seconds
+
+    def __getattr__(self, name):
+        return getattr(real_time, name)
+
+
+def fixed_clock(now):
+    """A stand-in for the datetime module whose datetime.now() is ``now``."""
+
+    class FixedDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now if tz is None else now.astimezone(tz)
+
+    return types.SimpleNamespace(
+        datetime=FixedDatetime, date=datetime.date, time=datetime.time,
+        timedelta=datetime.timedelta, tzinfo=datetime.tzinfo)
+
+
+def fixed_dt_util(now):
+    """A stand-in for homeassistant.util.dt whose now() is ``now``."""
+    return types.SimpleNamespace(now=lambda: now)
+
+
+# What the python_script integration lets a script reach on the objects it
+# injects
+_ALLOWED = [
+    ('hass', {'bus', 'services', 'states'}),
+    ('states', {'entity_ids', 'all', 'get', 'is_state', 'is_state_attr',
+                'remove', 'set'}),
+    ('services', {'services', 'has_service', 'call'}),
+    ('dt_util', {'utcnow', 'now', 'as_utc', 'as_timestamp', 'as_local',
+                 'utc_from_timestamp', 'start_of_local_day',
+                 'parse_datetime', 'parse_date', 'get_age'}),
+    ('datetime', {'date', 'time', 'datetime', 'timedelta', 'tzinfo'}),
+    ('time', {'sleep', 'strftime', 'strptime', 'gmtime', 'localtime',
+              'ctime', 'time', 'mktime'}),
+]
+
+
+def _protected_getattr(injected):
+    def protected_getattr(obj, name, default=None):
+        if name.startswith('async_'):
+            raise RuntimeError('Not allowed to access async methods')
+        for key, allowed in _ALLOWED:
+            if obj is injected[key] and name not in allowed:
+                raise RuntimeError('Not allowed to access %s.%s'
+                                   % (key, name))
+        # Underscore names never get this far: compile_restricted_exec
+        # rejects them
+        return getattr(obj, name, default)
+    return protected_getattr
+
+
+# datetime.strptime() imports _strptime through the caller's __builtins__
+# the first time it is used in a process, and the sandbox has no
+# __import__. By the time a script runs, Home Assistant has used it already.
+datetime.datetime.strptime('00:00', '%H:%M')
+
+_SOURCES = {}
+
+
+def run_script(path, hass, data, now=None, sleeper=None):
+    """Execute a python_script once, as Home Assistant would; returns the
+    wall times, in seconds, of compiling it and of running it."""
+    if path not in _SOURCES:
+        with open(path) as source:
+            _SOURCES[path] = source.read()
+    started = real_time.perf_counter()
+    compiled = compile_restricted_exec(_SOURCES[path], filename=path)
+    compiled_at = real_time.perf_counter()
+    if compiled.errors:
+        raise SyntaxError('; '.join(compiled.errors))
+    injected = {
+        'hass': hass,
+        'states': hass.states,
+        'services': hass.services,
+        'datetime': fixed_clock(now) if now else datetime,
+        'time': sleeper or FakeTime(),
+        'dt_util': fixed_dt_util(now or datetime.datetime.now().astimezone()),
+    }
+    builtins = dict(safe_builtins)
+    builtins.update(utility_builtins)
+    builtins.update({
+        'datetime': injected['datetime'],
+        'sorted': sorted,
+        'time': injected['time'],
+        'dt_util': injected['dt_util'],
+        'min': min,
+        'max': max,
+        'sum': sum,
+        'any': any,
+        'all': all,
+        'enumerate': enumerate,
+    })
+    script_globals = {
+        '__builtins__': builtins,
+        '_getattr_': _protected_getattr(injected),
+        '_write_': full_write_guard,
+        '_getiter_': iter,
+        '_getitem_': default_guarded_getitem,
+        '_iter_unpack_sequence_': guarded_iter_unpack_sequence,
+        '_unpack_sequence_': guarded_unpack_sequence,
+        'hass': hass,
+        'data': data,
+        'logger': logging.getLogger('bench.' + os.path.basename(path)),
+        'output': {},
+    }
+    started_exec = real_time.perf_counter()
+    exec(compiled.code, script_globals)
+    return (compiled_at - started, real_time.perf_counter() - started_exec)
+
+
+def synthetic_schedules(count, rng):
+    """``count`` schedules exercising every seasons.py feature."""
+    schedules = []
+    for number in range(count):
+        time_on = rng.randrange(0, 1440, 15)
+        time_off = (time_on + rng.randrange(15, 720, 15)) % 1440
+        schedule = {
+            'title': 'Schedule %d' % number,
+            'time_on': '%02d:%02d' % divmod(time_on, 60),
+            'time_off': '%02d:%02d' % divmod(time_off, 60),
+            'operation': rng.choice(['heat', 'cool']),
+            'setpoint': rng.randrange(60, 80),
+            'window': rng.choice(WINDOWS),
+        }
+        if rng.random() < 0.3:
+            schedule['days'] = rng.choice(['MTWTF..', '.....SS'])
+        if rng.random() < 0.3:
+            schedule[rng.choice(['if_home', 'if_away'])] = True
+        if rng.random() < 0.1:
+            schedule.update({'operation': 'dry', 'setpoint': None,
+                             'humidity_sensor': HUMIDITY_SENSOR,
+                             'if_humid': 63})
+        schedules.append(schedule)
+    # Always-on fallback, as real configs usually end with
+    schedules.append({'title': 'Fallback', 'operation': 'heat',
+                      'setpoint': 62})
+    return schedules
+
+
+def synthetic_setup(units, schedules_per_key, seed=0):
+    """(seasons input, units, initial states) for a synthetic house."""
+    rng = random.Random(seed)
+    unit_ids = ['climate.bench_%d' % number for number in range(units)]
+    seasons = {MODE: {unit: synthetic_schedules(schedules_per_key - 1, rng)
+                      for unit in unit_ids}}
+    states = {'input_select.climate_mode': MODE, AT_HOME_SENSOR: 'on',
+              HUMIDITY_SENSOR: '64'}
+    states.update({window: 'off' for window in WINDOWS})
+    for unit in unit_ids:
+        states[unit] = 'off'
+        states['input_text.seasons_' + unit.split('.', 1)[1]] = ''
+    return seasons, unit_ids, states
+
+
+def _summary(samples, hass, sleeper):
+    # Medians over the repeats: of each invocation's compile and exec time,
+    # and of the total of each repeat
+    timings = [timing for repeat in samples for timing in repeat]
+    return {
+        'invocations': len(samples[0]),
+        'compile_ms': statistics.median(
+            compiled for compiled, executed in timings) * 1000,
+        'exec_ms': statistics.median(
+            executed for compiled, executed in timings) * 1000,
+        'total_ms': statistics.median(
+            sum(compiled + executed for compiled, executed in repeat)
+            for repeat in samples) * 1000,
+        'service_calls': len(hass.services.calls),
+        'state_reads': hass.states.reads,
+        'slept_s': sleeper.slept,
+    }
+
+
+def bench_seasons(units, schedules_per_key, batch, from_timer, now,
+                  repeat=5):
+    seasons, unit_ids, states = synthetic_setup(units, schedules_per_key)
+    common = {'global_mode': 'input_select.climate_mode',
+              'at_home_sensor': AT_HOME_SENSOR, 'seasons': seasons}
+    if batch:
+        invocations = [dict(common, climate_units=unit_ids,
+                            state_entity='input_text.seasons_{}')]
+    else:
+        invocations = [dict(common, climate_unit=unit,
+                            state_entity='input_text.seasons_' +
+                            unit.split('.', 1)[1])
+                       for unit in unit_ids]
+    samples = []
+    for _ in range(repeat):
+        hass = FakeHass(states)
+        if from_timer:
+            # Timer ticks usually find every unit already set by an earlier
+            # run
+            for data in invocations:
+                run_script(SEASONS_SCRIPT, hass,
+                           dict(data, from_timer=False), now)
+            hass.services.calls = []
+            hass.states.reads = 0
+        sleeper = FakeTime()
+        samples.append([run_script(SEASONS_SCRIPT, hass,
+                                   dict(data, from_timer=from_timer), now,
+                                   sleeper)
+                        for data in invocations])
+    return _summary(samples, hass, sleeper)
+
+
+def bench_bedroom(now, from_timer, repeat=5):
+    data = {'climate_unit': 'climate.master_br',
+            'state_entity': 'input_text.bedroom_ac'}
+    samples = []
+    for _ in range(repeat):
+        hass = FakeHass({'input_select.climate_mode': 'Normal Summer',
+                         'climate.master_br': 'off',
+                         'binary_sensor.bedroom_window': 'off',
+                         'input_text.bedroom_ac': ''})
+        if from_timer:
+            run_script(BEDROOM_SCRIPT, hass, dict(data, from_timer=False),
+                       now)
+            hass.services.calls = []
+            hass.states.reads = 0
+        sleeper = FakeTime()
+        samples.append([run_script(BEDROOM_SCRIPT, hass,
+                                   dict(data, from_timer=from_timer), now,
+                                   sleeper)])
+    return _summary(samples, hass, sleeper)
+
+
+ROW = '%-28s %6s %9s %6s %10s %9s %10s %7s %6s %7s'
+
+
+def report(name, units, schedules, result):
+    print(ROW % (name, units, schedules, result['invocations'],
+                 '%.3f' % result['compile_ms'], '%.3f' % result['exec_ms'],
+                 '%.1f' % result['total_ms'], result['service_calls'],
+                 result['state_reads'], '%.1f' % result['slept_s']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--schedules', type=int, nargs='+',
+                        default=[1, 10, 100, 1000],
+                        help='schedules per (mode, unit) key, with one unit')
+    parser.add_argument('--units', type=int, nargs='+',
+                        default=[1, 10, 100, 500],
+                        help='climate units, with 10 schedules each')
+    parser.add_argument('--at', default='2026-10-14T22:30',
+                        help='local time to evaluate at (ISO format, in the '
+                             'system timezone unless an offset is given)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each scenario; medians are reported')
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+    now = datetime.datetime.fromisoformat(args.at).astimezone()
+
+    print(ROW % ('scenario', 'units', 'schedules', 'runs', 'compile ms',
+                 'exec ms', 'total ms', 'calls', 'reads', 'slept'))
+    sizes = ([(1, count) for count in args.schedules] +
+             [(count, 10) for count in args.units])
+    for units, schedules in sizes:
+        for batch in (False, True):
+            for from_timer in (False, True):
+                name = 'seasons %s %s' % ('batch' if batch else 'per-unit',
+                                          'timer' if from_timer else 'event')
+                report(name, units, schedules,
+                       bench_seasons(units, schedules, batch, from_timer,
+                                     now, args.repeat))
+    for from_timer in (False, True):
+        report('bedroom_ac %s' % ('timer' if from_timer else 'event'),
+               1, 1, bench_bedroom(now, from_timer, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Load the schedule logic of seasons.py without Home Assistant.
+
+The loader itself is the integration's, custom_components/seasons/loader.py,
+loaded by path: importing the package would import Home Assistant.
+"""
+import importlib.util
+import json
+import logging
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'seasons.py')
+
+
+def _load_loader():
+    path = os.path.join(ROOT, 'custom_components', 'seasons', 'loader.py')
+    spec = importlib.util.spec_from_file_location('seasons_loader', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+_loader = _load_loader()
+
+
+class Engine(_loader.ScriptEngine):
+    """The functions and constants of seasons.py in their own namespace."""
+
+    def __init__(self, path=SCRIPT):
+        super().__init__(path, {
+            'logger': logging.getLogger('seasons'),
+            'data': {},
+        })
+        self.use_schedules(self.namespace['SEASONS'])
+
+    def use_schedules(self, seasons):
+        """Evaluate against ``seasons``, keyed by (mode, unit) tuples."""
+        self.namespace['SEASONS'] = seasons
+        self.forget_compiled()
+
+    def compiled_table(self):
+        """Compiled records, tables and keys, for ``use_compiled()`` in
+        another process."""
+        return self.compiled_form()
+
+    def use_compiled(self, table):
+        """Evaluate against a ``compiled_table()`` without recompiling."""
+        self.use_schedules({})
+        self.adopt_compiled(table)
+
+    def load_schedules(self, path):
+        """Evaluate against a seasons.yaml (or .json) file."""
+        with open(path) as source:
+            if path.endswith('.json'):
+                raw = json.load(source)
+            else:
+                import yaml
+                raw = yaml.safe_load(source)
+        self.use_schedules(self.load_seasons(raw))
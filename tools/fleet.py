@@ -0,0 +1,137 @@
+"""Evaluate seasons.py decisions for a whole fleet of climate units.
+
+Takes exported input snapshots for any number of units and returns what
+seasons.py would decide for each of them at a given time. Units are sharded
+across a process pool; the schedules are compiled once in the parent and
+each worker receives the compiled table once, when it starts::
+
+    python -m tools.fleet seasons.yaml snapshots.json --at 2026-10-14T21:59
+
+snapshots.json maps each climate unit to its inputs::
+
+    {"climate.master_br": {"mode": "Hot Summer", "home": true,
+                           "states": {"binary_sensor.bedroom_window": "off",
+                                      "sensor.dewpoint_mbr": "64.2"},
+                           "saved_state": "cool-76", "from_timer": false}}
+
+``home`` may be null for units without an at_home_sensor; ``saved_state``,
+``from_timer`` and ``humid_latch`` (the index of the schedule holding the
+humidity latch, see if_humid_release) are optional.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import math
+import os
+import zoneinfo
+
+from tools.engine import Engine
+
+_engine = None
+
+
+class _State:
+    def __init__(self, state):
+        self.state = state
+        self.attributes = {}
+
+
+class SnapshotStore:
+    """A ``states`` mapping served in place of hass.states."""
+
+    def __init__(self, states):
+        self.states = states
+
+    def get(self, entity_id):
+        if entity_id not in self.states:
+            return None
+        return _State(str(self.states[entity_id]))
+
+
+def _init_worker(table):
+    global _engine
+    _engine = Engine()
+    _engine.use_compiled(table)
+
+
+def evaluate(engine, climate_unit, inputs, now):
+    """seasons.py's decision for one unit given its input snapshot, at the
+    timezone-aware local time ``now``."""
+    snapshot = engine.new_snapshot(SnapshotStore(inputs.get('states', {})))
+    decision = engine.evaluate_unit(
+        climate_unit, inputs['mode'], bool(inputs.get('home')),
+        inputs.get('saved_state'), inputs.get('from_timer', False),
+        now, snapshot, inputs.get('humid_latch'))
+    del decision['inputs']
+    return decision
+
+
+def _evaluate_shard(shard, now):
+    return [(climate_unit, evaluate(_engine, climate_unit, inputs, now))
+            for climate_unit, inputs in shard]
+
+
+def evaluate_fleet(engine, snapshots, when, workers=None, shards_per_worker=4):
+    """Decisions for every unit in ``snapshots`` at datetime ``when``
+    (naive means the system's local time).
+
+    ``engine`` has its schedules loaded already; its compiled table is sent
+    to each worker process once. Returns {climate_unit: decision}.
+    """
+    workers = workers or os.cpu_count() or 1
+    if when.tzinfo is None:
+        when = when.astimezone()
+    # An aware time keeps its own zone: schedules run on the unit's clock
+    now = when.replace(second=0, microsecond=0)
+    items = sorted(snapshots.items())
+    if not items:
+        return {}
+    size = math.ceil(len(items) / (workers * shards_per_worker))
+    shards = [items[start:start + size]
+              for start in range(0, len(items), size)]
+    decisions = {}
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(engine.compiled_table(),)) as pool:
+        futures = [pool.submit(_evaluate_shard, shard, now)
+                   for shard in shards]
+        for future in futures:
+            decisions.update(future.result())
+    return decisions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('schedules', help='seasons.yaml or .json file')
+    parser.add_argument('snapshots', help='JSON file of unit input snapshots')
+    parser.add_argument('--at', help='local time to evaluate at (ISO '
+                        'format, default now)')
+    parser.add_argument('--timezone', help='IANA timezone of --at, e.g. '
+                        'America/New_York (default: the system\'s current '
+                        'UTC offset)')
+    parser.add_argument('--workers', type=int, help='worker processes '
+                        '(default: one per CPU)')
+    parser.add_argument('--changes-only', action='store_true',
+                        help="only print units whose decision differs "
+                             "from their saved_state")
+    args = parser.parse_args(argv)
+
+    engine = Engine()
+    engine.load_schedules(args.schedules)
+    with open(args.snapshots) as source:
+        snapshots = json.load(source)
+    when = (datetime.datetime.fromisoformat(args.at) if args.at
+            else datetime.datetime.now())
+    if args.timezone and when.tzinfo is None:
+        when = when.replace(tzinfo=zoneinfo.ZoneInfo(args.timezone))
+    decisions = evaluate_fleet(engine, snapshots, when, args.workers)
+    for climate_unit, decision in sorted(decisions.items()):
+        if (args.changes_only and decision['next_state'] ==
+                snapshots[climate_unit].get('saved_state')):
+            continue
+        print(json.dumps(decision))
+
+
+if __name__ == '__main__':
+    main()
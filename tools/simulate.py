@@ -0,0 +1,227 @@
+"""Simulate a week of seasons.py decisions at one-minute resolution.
+
+For every (global mode, climate unit) key the first-match rules of
+seasons.py are evaluated for all 10080 minutes of a week at once with NumPy:
+each compiled schedule becomes a boolean row over the week, and the decision
+at each minute is the first row that is true. Presence, windows and humidity
+are given as per-minute series.
+
+Requires NumPy, and PyYAML to read seasons.yaml::
+
+    python -m tools.simulate seasons.yaml --mode 'Cold Shoulder' \\
+        --away 'Mon 08:00' 'Mon 17:30' --humidity 65
+"""
+import argparse
+
+import numpy as np
+
+from tools.engine import Engine
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _week_minutes(engine):
+    minute_of_week = np.arange(engine.MINUTES_PER_WEEK)
+    return (minute_of_week // engine.MINUTES_PER_DAY,
+            minute_of_week % engine.MINUTES_PER_DAY)
+
+
+def schedule_window(engine, record):
+    """Minutes of the week in which ``record``'s time and day window is open.
+
+    The same window as ``schedule_intervals()`` in seasons.py, as a mask.
+    """
+    day, minute = _week_minutes(engine)
+    time_on, time_off = record['time_on'], record['time_off']
+    if time_on is None or time_on == time_off:
+        in_time = np.ones(minute.shape, dtype=bool)
+        start_day = day
+    elif time_on < time_off:
+        in_time = (minute >= time_on) & (minute < time_off)
+        start_day = day
+    else:
+        # crosses midnight: before time_off it started yesterday
+        in_time = (minute >= time_on) | (minute < time_off)
+        start_day = np.where(minute >= time_on, day, (day - 1) % 7)
+    day_match = ((record['days'] >> start_day) & 1).astype(bool)
+    return in_time & day_match
+
+
+def simulate_key(engine, key, home=None, windows=None, humidity=None):
+    """Decisions for one (mode, unit) key over a week.
+
+    ``home`` is a boolean series (None means no at_home_sensor), ``windows``
+    and ``humidity`` map entity ids to boolean and float series. Series have
+    one entry per minute of the week, Monday 00:00 first. Entities missing
+    from ``windows`` are closed and from ``humidity`` are above every
+    threshold.
+
+    Returns a dict of per-minute arrays: ``schedule`` (index of the matched
+    schedule, -1 for none), ``window_open``, ``operation``, ``setpoint`` and
+    ``title``, the last three as seasons.py would send and log them.
+    """
+    windows = windows or {}
+    humidity = humidity or {}
+    records = engine.compiled_schedules(key)
+    size = engine.MINUTES_PER_WEEK
+    is_home = (np.zeros(size, dtype=bool) if home is None
+               else np.asarray(home, dtype=bool))
+
+    applies = np.zeros((len(records) + 1, size), dtype=bool)
+    window_open = np.zeros((len(records) + 1, size), dtype=bool)
+    # Rows of schedules with an if_humid_release band, and where they would
+    # apply while holding the humidity latch
+    latching = {}
+    for row, record in enumerate(records):
+        active = schedule_window(engine, record)
+        if record['presence'] == 'home':
+            active &= is_home
+        elif record['presence'] == 'away':
+            active &= ~is_home
+        sensor = record['humidity_sensor']
+        if sensor and sensor in humidity:
+            reading = np.asarray(humidity[sensor])
+            if record['if_humid_release'] is not None:
+                latching[row] = active & ~(reading <
+                                           record['if_humid_release'])
+            active &= ~(reading < record['if_humid'])
+        applies[row] = active
+        if record['window'] in windows:
+            window_open[row] = np.asarray(windows[record['window']],
+                                          dtype=bool)
+    # Sentinel row that always applies, so argmax finds 'no match' too
+    applies[-1] = True
+    first = applies.argmax(axis=0)
+    if latching:
+        first = _hold_latches(latching, first)
+    minutes = np.arange(size)
+    matched = first < len(records)
+    opened = window_open[first, minutes] & matched
+
+    operations = np.array([r['operation'] for r in records] + [None],
+                          dtype=object)
+    setpoints = np.array([r['setpoint'] for r in records] + [None],
+                         dtype=object)
+    titles = np.array([r['title'] for r in records] + [None], dtype=object)
+    operation = operations[first]
+    setpoint = setpoints[first]
+    title = titles[first]
+
+    title[opened] = np.char.add(titles[first[opened]].astype(str),
+                                ' (Window open)')
+    operation[opened] = 'off'
+    setpoint[opened] = None
+    if key[0] != 'Manual':
+        operation[~matched] = 'off'
+        title[~matched] = 'Default (Off)'
+    return {
+        'schedule': np.where(matched, first, -1),
+        'window_open': opened,
+        'operation': operation,
+        'setpoint': setpoint,
+        'title': title,
+    }
+
+
+def _hold_latches(latching, first):
+    # A schedule that applied keeps applying while above its release
+    # threshold, unless an earlier schedule applies. Only an earlier row can
+    # cut a hold short or keep a row from starting one, so rows are resolved
+    # in order, each over whole runs of minutes: a hold starts where the row
+    # is in force and lasts until the first minute that is below release or
+    # has an earlier row applying.
+    held = first.copy()
+    minutes = np.arange(len(first))
+    for row in sorted(latching):
+        starts = held == row
+        breaks = starts | ~(latching[row] & (first >= row))
+        last_break = np.maximum.accumulate(np.where(breaks, minutes, -1))
+        holding = (last_break >= 0) & starts[np.maximum(last_break, 0)]
+        held[holding] = row
+    return held
+
+
+def simulate(engine, keys=None, **series):
+    """``simulate_key()`` for every key (default: all keys in SEASONS)."""
+    if keys is None:
+        keys = list(engine.SEASONS)
+    return {key: simulate_key(engine, key, **series) for key in keys}
+
+
+def timeline(result):
+    """Compress a simulation to [(minute_of_week, operation, setpoint, title)]
+    at every minute where the decision changes."""
+    operation, setpoint, title = (result['operation'], result['setpoint'],
+                                  result['title'])
+    changed = np.ones(len(operation), dtype=bool)
+    changed[1:] = ((operation[1:] != operation[:-1]) |
+                   (setpoint[1:] != setpoint[:-1]) |
+                   (title[1:] != title[:-1]))
+    return [(int(m), operation[m], setpoint[m], title[m])
+            for m in np.flatnonzero(changed)]
+
+
+def _minute_of_week(text):
+    day, clock = text.split()
+    hours, minutes = clock.split(':')
+    return DAYS.index(day[:3].title()) * 1440 + int(hours) * 60 + int(minutes)
+
+
+def _format_minute(minute):
+    return '%s %02d:%02d' % (DAYS[minute // 1440], minute % 1440 // 60,
+                             minute % 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('schedules', help='seasons.yaml or .json file')
+    parser.add_argument('--mode', help='only keys in this global mode')
+    parser.add_argument('--unit', help='only keys for this climate unit')
+    parser.add_argument('--away', nargs=2, action='append', default=[],
+                        metavar=('START', 'END'),
+                        help="nobody home from START to END, e.g. "
+                             "'Mon 08:00' 'Mon 17:30' (repeatable)")
+    parser.add_argument('--no-presence', action='store_true',
+                        help='simulate without an at_home_sensor')
+    parser.add_argument('--open', action='append', default=[],
+                        help='window entity open all week (repeatable)')
+    parser.add_argument('--humidity', type=float,
+                        help='constant reading for every humidity sensor')
+    args = parser.parse_args(argv)
+
+    engine = Engine()
+    engine.load_schedules(args.schedules)
+    keys = [key for key in engine.SEASONS
+            if (not args.mode or key[0] == args.mode) and
+            (not args.unit or key[1] == args.unit)]
+
+    home = None
+    if not args.no_presence:
+        home = np.ones(engine.MINUTES_PER_WEEK, dtype=bool)
+        for start, end in args.away:
+            start, end = _minute_of_week(start), _minute_of_week(end)
+            if start <= end:
+                home[start:end] = False
+            else:
+                home[start:] = False
+                home[:end] = False
+    windows = {entity: np.ones(engine.MINUTES_PER_WEEK, dtype=bool)
+               for entity in args.open}
+    humidity = {}
+    if args.humidity is not None:
+        sensors = set(record['humidity_sensor'] for key in keys
+                      for record in engine.compiled_schedules(key))
+        humidity = {sensor: np.full(engine.MINUTES_PER_WEEK, args.humidity)
+                    for sensor in sensors if sensor}
+
+    results = simulate(engine, keys, home=home, windows=windows,
+                       humidity=humidity)
+    for key, result in results.items():
+        print('%s / %s' % key)
+        for minute, operation, setpoint, title in timeline(result):
+            print('  %s  %-5s %-5s %s' % (_format_minute(minute), operation,
+                                          setpoint, title))
+
+
+if __name__ == '__main__':
+    main()